@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+@author: superwongo
+@project: k8s-certs-generator
+@file: bench_startup
+@time: 2026/10/18
+
+启动耗时基准：测量verify子命令相对裸解释器启动的额外耗时，超出预算时返回非0退出码
+    python benchmarks/bench_startup.py --budget-ms 80
+"""
+
+import ast
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from build_zipapp import build  # noqa: E402
+
+# 生成器按需导入的模块，verify不应加载；标准库启动时已导入的模块（如shutil、ipaddress）不做延迟导入，不在此列
+LAZY_MODULES = (
+    'json', 'getpass', 'queue', 'hashlib', 'concurrent.futures',
+    'tempfile', 'tarfile', 'statistics', 'subprocess', 'logging.handlers',
+)
+# 探针不导入json等被检查的模块，以repr输出已加载模块列表
+CHECK_LOADED = """import sys, runpy
+target, sys.argv = sys.argv[1], ['k8s-certs-generator', 'verify', '--k8s-root-dir', sys.argv[2]]
+try:
+    runpy.run_path(target, run_name='__main__')
+except SystemExit:
+    pass
+print(repr(sorted(sys.modules)), file=sys.stderr)
+"""
+
+
+def measure(cmd, runs):
+    """多次执行取中位数，单位毫秒"""
+    costs = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        costs.append((time.perf_counter() - start) * 1000)
+    return statistics.median(costs)
+
+
+def loaded_modules(cmd):
+    ret = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    return set(ast.literal_eval(ret.stderr.decode().strip().splitlines()[-1]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='verify子命令启动耗时基准')
+    parser.add_argument('--budget-ms', type=float, default=80, help='相对裸解释器的额外耗时预算，默认80毫秒')
+    parser.add_argument('--runs', type=int, default=20, help='执行次数，取中位数')
+    parser.add_argument('--source', action='store_true', help='直接测量源码脚本，默认测量预编译zipapp')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        target = str(ROOT_DIR / 'k8s-certs-generator.py') if args.source else build(f'{tmp_dir}/k8s-certs-generator.pyz')
+        k8s_root_dir = f'{tmp_dir}/kubernetes'
+
+        loaded = loaded_modules([sys.executable, '-c', CHECK_LOADED, target, k8s_root_dir])
+        unexpected = sorted(name for name in LAZY_MODULES if name in loaded)
+
+        bare = measure([sys.executable, '-c', 'pass'], args.runs)
+        verify = measure([sys.executable, target, 'verify', '--k8s-root-dir', k8s_root_dir], args.runs)
+
+    overhead = verify - bare
+    print(f'target: {target}')
+    print(f'bare interpreter: {bare:.1f}ms, verify: {verify:.1f}ms, overhead: {overhead:.1f}ms, '
+          f'budget: {args.budget_ms:.1f}ms')
+    failed = False
+    if unexpected:
+        failed = True
+        print(f'FAIL: verify loaded lazy modules: {", ".join(unexpected)}')
+    if overhead > args.budget_ms:
+        failed = True
+        print('FAIL: startup overhead exceeds budget')
+    if not failed:
+        print('OK')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
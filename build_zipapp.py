@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+"""
+@author: superwongo
+@project: k8s-certs-generator
+@file: build_zipapp
+@time: 2026/10/18
+"""
+
+import sys
+import shutil
+import zipapp
+import argparse
+import compileall
+import tempfile
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent
+MAIN = """import sys
+from k8s_certs_generator import main
+
+sys.exit(main())
+"""
+
+
+def build(output):
+    """
+    打包为zipapp，模块预编译为pyc，启动时无需解压与编译源码
+    :param output: 输出文件路径
+    :return:
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app_dir = Path(tmp_dir) / 'app'
+        app_dir.mkdir()
+        shutil.copy2(ROOT_DIR / 'k8s-certs-generator.py', app_dir / 'k8s_certs_generator.py')
+        (app_dir / '__main__.py').write_text(MAIN)
+        # zipimport只识别与源码同目录的pyc，需使用legacy布局
+        compileall.compile_dir(str(app_dir), quiet=1, legacy=True)
+        Path(output).parent.mkdir(parents=True, exist_ok=True)
+        zipapp.create_archive(app_dir, output, interpreter='/usr/bin/env python3')
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='打包k8s-certs-generator为zipapp')
+    parser.add_argument('-o', '--output', default=str(ROOT_DIR / 'dist' / 'k8s-certs-generator.pyz'), help='输出文件路径')
+    args = parser.parse_args(argv)
+    print(build(args.output))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
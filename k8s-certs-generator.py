@@ -7,12 +7,48 @@
 @time: 2021/12/16
 """
 
-import logging
-import subprocess
+import io
+import os
+import re
+import sys
+import time
+import atexit
 import base64
 import shutil
+import logging
+import weakref
+import argparse
+import importlib
+import ipaddress
+import threading
 from pathlib import Path
 from configparser import ConfigParser
+from datetime import datetime, timedelta, timezone
+
+
+class LazyModule(object):
+    """延迟导入的模块，首次访问属性时才真正导入，verify等子命令只加载自身所需模块"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, item):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, item)
+
+
+json = LazyModule('json')
+getpass = LazyModule('getpass')
+queue = LazyModule('queue')
+hashlib = LazyModule('hashlib')
+futures = LazyModule('concurrent.futures')
+tempfile = LazyModule('tempfile')
+tarfile = LazyModule('tarfile')
+statistics = LazyModule('statistics')
+subprocess = LazyModule('subprocess')
+log_handlers = LazyModule('logging.handlers')
 
 
 class MyConfigParser(ConfigParser):
@@ -20,6 +56,445 @@ class MyConfigParser(ConfigParser):
         return optionstr
 
 
+LOGGER_NAME = 'k8s-certs-generator'
+TEXT_LOG_FORMAT = '[%(asctime)s] %(levelname)s %(process)d %(module)s %(lineno)s: | %(message)s'
+
+_logging_lock = threading.Lock()
+_logging_state = {'handler': None, 'listener': None, 'format': None}
+
+
+class JsonFormatter(logging.Formatter):
+    """JSON日志格式，每条日志一行，附带集群与证书标识"""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'process': record.process,
+            'thread': record.threadName,
+            'module': record.module,
+            'lineno': record.lineno,
+            'cluster': getattr(record, 'cluster', None),
+            'artifact': getattr(record, 'artifact', None),
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class DumpSampler(logging.Filter):
+    """
+    证书内容等大段日志（extra={'dump': True}）按日志级别采样
+    rates: {'INFO': 10} 表示INFO级别每10条只保留1条，未配置的级别全部保留
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = {key.upper(): int(value) for key, value in (rates or {}).items()}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if not getattr(record, 'dump', False):
+            return True
+        rate = self.rates.get(record.levelname, 1)
+        if rate <= 1:
+            return True
+        with self._lock:
+            count = self._counters.get(record.levelname, 0)
+            self._counters[record.levelname] = count + 1
+        return count % rate == 0
+
+
+class ContextLoggerAdapter(logging.LoggerAdapter):
+    """
+    合并默认extra（集群标识）与单次调用传入的extra（证书标识等）
+    日志级别在适配器上单独判断，各生成器互不影响共用日志器的级别
+    """
+
+    def __init__(self, logger, extra, level=logging.NOTSET):
+        super().__init__(logger, extra)
+        self.level = level
+
+    def getEffectiveLevel(self):
+        return max(self.level, self.logger.getEffectiveLevel())
+
+    def isEnabledFor(self, level):
+        return level >= self.level and self.logger.isEnabledFor(level)
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = dict(self.extra, **kwargs.get('extra', {}))
+        return msg, kwargs
+
+
+def setup_logging(level=None, log_format=None, log_queue=None, listen=True, dump_sample_rates=None):
+    """
+    初始化日志，同一进程内只挂载一个QueueHandler，输出格式以首次初始化为准
+    共用日志器本身不做级别过滤，各生成器的级别由ContextLoggerAdapter判断
+    :param level: 全局日志级别，作用于队列处理器，为空时不限制；重复调用时更新
+    :param log_format: 输出格式：text, json，为空时首次初始化使用text，之后沿用已初始化的格式
+    :param log_queue: 日志队列，多进程场景传入multiprocessing.Queue，默认为线程队列
+    :param listen: 是否在当前进程启动输出监听，多进程场景子进程传False，由主进程统一输出
+    :param dump_sample_rates: 证书内容日志按级别采样比例，如{'INFO': 10}
+    :return:
+    """
+    logger = logging.getLogger(LOGGER_NAME)
+    with _logging_lock:
+        handler = _logging_state['handler']
+        if handler is not None:
+            if level is not None:
+                handler.setLevel(getattr(logging, level.upper()))
+            if log_format is not None and log_format != _logging_state['format']:
+                logger.warning(f'=====日志已按{_logging_state["format"]}格式初始化，忽略{log_format}格式=====')
+            return logger
+        logger.setLevel(logging.DEBUG)
+        log_queue = log_queue if log_queue is not None else queue.Queue(-1)
+        handler = log_handlers.QueueHandler(log_queue)
+        if level is not None:
+            handler.setLevel(getattr(logging, level.upper()))
+        handler.addFilter(DumpSampler(dump_sample_rates))
+        logger.addHandler(handler)
+        logger.propagate = False
+        _logging_state['handler'] = handler
+        log_format = log_format or 'text'
+        _logging_state['format'] = log_format
+        if listen:
+            stream_handler = logging.StreamHandler()
+            if log_format == 'json':
+                stream_handler.setFormatter(JsonFormatter())
+            else:
+                stream_handler.setFormatter(logging.Formatter(TEXT_LOG_FORMAT))
+            listener = log_handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+            listener.start()
+            _logging_state['listener'] = listener
+            atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging():
+    """停止日志监听并输出队列中剩余日志"""
+    with _logging_lock:
+        listener, _logging_state['listener'] = _logging_state['listener'], None
+        handler, _logging_state['handler'] = _logging_state['handler'], None
+    if listener is not None:
+        listener.stop()
+    if handler is not None:
+        logging.getLogger(LOGGER_NAME).removeHandler(handler)
+
+
+class ClusterTopology(object):
+    """
+    集群拓扑：master节点、对外服务地址与Service子网
+    统一校验、规范化DNS与IP，并预计算去重后的SAN，供各证书复用
+    """
+
+    etcd_dns = ('localhost',)
+    etcd_ipaddrs = ('127.0.0.1', '::1')
+    apiserver_dns = (
+        'kubernetes',
+        'kubernetes.default',
+        'kubernetes.default.svc',
+        'kubernetes.default.svc.cluster',
+        'kubernetes.default.svc.cluster.local',
+    )
+    dns_label_pattern = re.compile(r'^(?!-)[a-z0-9-]{1,63}(?<!-)$')
+
+    def __init__(self, service_subnet='10.96.0.0/12'):
+        """
+        :param service_subnet: Service子网CIDR，双栈以逗号分隔，如：10.96.0.0/12,fd00:10:96::/112
+        """
+        self.service_networks = self.parse_service_subnet(service_subnet)
+        self._masters = []
+        self._advertise_internal_ipaddr = None
+        self._advertise_external_ipaddr = None
+        self._sans = {}
+
+    @staticmethod
+    def parse_service_subnet(service_subnet):
+        """
+        解析Service子网，最多允许IPv4、IPv6各一个
+        :param service_subnet: 子网CIDR，双栈以逗号分隔
+        :return: [ipaddress.IPv4Network | ipaddress.IPv6Network, ...]
+        """
+        networks = []
+        for cidr in str(service_subnet).split(','):
+            cidr = cidr.strip()
+            if not cidr:
+                continue
+            try:
+                network = ipaddress.ip_network(cidr, strict=False)
+            except ValueError:
+                raise ValueError(f'Service子网CIDR格式错误：{cidr}') from None
+            if network.num_addresses < 2:
+                raise ValueError(f'Service子网CIDR过小：{cidr}')
+            if any(item.version == network.version for item in networks):
+                raise ValueError(f'Service子网CIDR重复配置了IPv{network.version}：{service_subnet}')
+            networks.append(network)
+        if not networks:
+            raise ValueError('Service子网CIDR不能为空')
+        return networks
+
+    @staticmethod
+    def normalize_ipaddr(ipaddr):
+        """校验并规范化IP地址，IPv6统一为压缩格式"""
+        try:
+            return ipaddress.ip_address(str(ipaddr).strip()).compressed
+        except ValueError:
+            raise ValueError(f'IP地址格式错误：{ipaddr}') from None
+
+    @classmethod
+    def normalize_dns(cls, hostname):
+        """校验并规范化主机名，统一小写并去掉末尾的点"""
+        dns = str(hostname).strip().lower().rstrip('.')
+        if not dns or len(dns) > 253 or not all(cls.dns_label_pattern.match(label) for label in dns.split('.')):
+            raise ValueError(f'主机名格式错误：{hostname}')
+        return dns
+
+    @property
+    def service_vips(self):
+        """kubernetes服务IP，取各Service子网的第一个地址"""
+        return [str(network.network_address + 1) for network in self.service_networks]
+
+    @property
+    def masters(self):
+        return list(self._masters)
+
+    @property
+    def ipaddr_list(self):
+        return list(dict.fromkeys(ipaddr for ipaddr, _ in self._masters))
+
+    @property
+    def dns_list(self):
+        return list(dict.fromkeys(hostname for _, hostname in self._masters))
+
+    @property
+    def advertise_internal_ipaddr(self):
+        return self._advertise_internal_ipaddr
+
+    @advertise_internal_ipaddr.setter
+    def advertise_internal_ipaddr(self, ipaddr):
+        self._advertise_internal_ipaddr = self.normalize_ipaddr(ipaddr) if ipaddr else None
+        self._sans.clear()
+
+    @property
+    def advertise_external_ipaddr(self):
+        return self._advertise_external_ipaddr
+
+    @advertise_external_ipaddr.setter
+    def advertise_external_ipaddr(self, ipaddr):
+        self._advertise_external_ipaddr = self.normalize_ipaddr(ipaddr) if ipaddr else None
+        self._sans.clear()
+
+    @property
+    def api_server(self):
+        """ApiServer访问地址，IPv6地址加方括号，未设置对外服务内网地址时报错"""
+        ipaddr = self._advertise_internal_ipaddr
+        if not ipaddr:
+            raise ValueError('未设置ApiServer对外服务内网地址，请先注册Master节点')
+        if ':' in ipaddr:
+            ipaddr = f'[{ipaddr}]'
+        return f'https://{ipaddr}:6443'
+
+    def register_master(self, ipaddr, hostname):
+        """
+        注册master节点
+        :return: 规范化后的(ipaddr, hostname)
+        """
+        master = (self.normalize_ipaddr(ipaddr), self.normalize_dns(hostname))
+        # 默认对外服务的内网IP地址为第一个注册的master节点IP
+        if not self._masters:
+            self._advertise_internal_ipaddr = master[0]
+        if master not in self._masters:
+            self._masters.append(master)
+            self._sans.clear()
+        return master
+
+    @staticmethod
+    def build_alt_names(dns_list, ipaddr_list):
+        """
+        组装csr配置alt_names，DNS与IP分别按出现顺序去重
+        :return: [('DNS.0', dns), ..., ('IP.0', ipaddr), ...]
+        """
+        alt_names = [(f'DNS.{index}', dns) for index, dns in enumerate(dict.fromkeys(dns_list))]
+        alt_names.extend((f'IP.{index}', ipaddr) for index, ipaddr in enumerate(dict.fromkeys(ipaddr_list)))
+        return alt_names
+
+    @property
+    def etcd_alt_names(self):
+        """ETCD server/peer证书SAN：localhost、回环地址、各master节点"""
+        if 'etcd' not in self._sans:
+            self._sans['etcd'] = self.build_alt_names(
+                [*self.etcd_dns, *self.dns_list],
+                [*self.etcd_ipaddrs, *self.ipaddr_list],
+            )
+        return self._sans['etcd']
+
+    @property
+    def apiserver_alt_names(self):
+        """ApiServer证书SAN：kubernetes服务域名与服务IP、各master节点、对外服务地址"""
+        if 'apiserver' not in self._sans:
+            ipaddr_list = [*self.service_vips, *self.ipaddr_list]
+            for ipaddr in (self._advertise_internal_ipaddr, self._advertise_external_ipaddr):
+                if ipaddr:
+                    ipaddr_list.append(ipaddr)
+            self._sans['apiserver'] = self.build_alt_names([*self.apiserver_dns, *self.dns_list], ipaddr_list)
+        return self._sans['apiserver']
+
+
+# 所有CA签名上下文的弱引用，进程退出时统一清零，不延长生成器的生命周期
+_signing_contexts = weakref.WeakSet()
+
+
+def _wipe_signing_contexts():
+    for context in list(_signing_contexts):
+        context.wipe()
+
+
+atexit.register(_wipe_signing_contexts)
+
+
+class CASigningContext(object):
+    """
+    CA签名上下文
+    CA私钥每次运行（或常驻进程会话）只读取、解密一次，明文直接读入bytearray保存在内存中，
+    签发证书时通过标准输入交给openssl，不落盘，调用wipe或退出时清零；
+    openssl进程与管道缓冲区中的明文不在本进程控制范围内
+    """
+
+    passphrase_env = 'K8S_CERTS_CA_PASSPHRASE'
+
+    def __init__(self, passphrase=None, keyfile=None):
+        """
+        :param passphrase: CA私钥加密口令
+        :param keyfile: 保存CA私钥加密口令的文件，与passphrase二选一
+        """
+        if passphrase and keyfile:
+            raise ValueError('CA私钥加密口令与口令文件只能指定一个')
+        self._passphrase = passphrase
+        self.keyfile = keyfile
+        self._keys = {}
+        self._lock = threading.Lock()
+        _signing_contexts.add(self)
+
+    @property
+    def encrypted(self):
+        return bool(self._passphrase or self.keyfile)
+
+    @property
+    def pass_source(self):
+        """openssl -passin/-passout参数，口令通过环境变量或文件传递，不出现在命令行中"""
+        if self.keyfile:
+            return f'file:{self.keyfile}'
+        return f'env:{self.passphrase_env}'
+
+    @property
+    def env(self):
+        """调用openssl时使用的环境变量"""
+        if not self._passphrase:
+            return None
+        return dict(os.environ, **{self.passphrase_env: self._passphrase})
+
+    @staticmethod
+    def key_encrypted(key_file):
+        """私钥文件是否已加密，PEM头（BEGIN ENCRYPTED PRIVATE KEY或Proc-Type: 4,ENCRYPTED）在前128字节内"""
+        with open(key_file, 'rb') as f:
+            return b'ENCRYPTED' in f.read(128)
+
+    def load(self, ca_path, ca_name):
+        """
+        获取CA私钥明文，首次调用时读取并解密
+        :param ca_path: CA证书路径
+        :param ca_name: CA证书名称
+        :return: bytearray
+        """
+        key = (str(ca_path), ca_name)
+        with self._lock:
+            if key not in self._keys:
+                key_file = f'{ca_path}/{ca_name}.key'
+                if not self.encrypted and self.key_encrypted(key_file):
+                    raise ValueError(f'CA私钥{key_file}已加密，请提供CA私钥加密口令')
+                # 明文私钥与加密私钥长度相近，以文件大小预分配缓冲区
+                size_hint = os.path.getsize(key_file) + 1024
+                if self.encrypted:
+                    proc = subprocess.Popen(
+                        ['openssl', 'pkey', '-in', key_file, '-passin', self.pass_source],
+                        env=self.env,
+                        stdout=subprocess.PIPE,
+                        stderr=subprocess.PIPE,
+                        bufsize=0,
+                    )
+                    with proc:
+                        data = self._read_into(proc.stdout, size_hint)
+                        stderr = proc.stderr.read()
+                    if proc.returncode:
+                        data[:] = bytes(len(data))
+                        raise subprocess.CalledProcessError(proc.returncode, proc.args, stderr=stderr)
+                else:
+                    with open(key_file, 'rb', buffering=0) as f:
+                        data = self._read_into(f, size_hint)
+                self._keys[key] = data
+            return self._keys[key]
+
+    @staticmethod
+    def _read_into(stream, size_hint):
+        """
+        从无缓冲的文件或管道直接读入bytearray，扩容与截取后清零中间缓冲区，不产生bytes副本
+        :param stream: 无缓冲的文件对象
+        :param size_hint: 预分配大小
+        :return: bytearray
+        """
+        buf, length = bytearray(size_hint), 0
+        while True:
+            if length == len(buf):
+                larger = bytearray(len(buf) * 2)
+                larger[:length] = buf
+                buf[:] = bytes(len(buf))
+                buf = larger
+            with memoryview(buf) as view:
+                count = stream.readinto(view[length:])
+            if not count:
+                break
+            length += count
+        with memoryview(buf) as view:
+            data = bytearray(view[:length])
+        buf[:] = bytes(len(buf))
+        return data
+
+    def unlock(self, cas):
+        """
+        预先解密CA私钥，口令错误时在签发任何证书前报错
+        :param cas: [(ca_path, ca_name), ...]
+        :return:
+        """
+        for ca_path, ca_name in cas:
+            self.load(ca_path, ca_name)
+
+    def copy(self):
+        """相同口令的新上下文，不共享已解密的CA私钥"""
+        return CASigningContext(self._passphrase, self.keyfile)
+
+    def discard(self, ca_path, ca_name):
+        """CA私钥重新生成后清除旧的明文缓存"""
+        with self._lock:
+            data = self._keys.pop((str(ca_path), ca_name), None)
+        if data is not None:
+            data[:] = bytes(len(data))
+
+    def wipe(self):
+        """清零并清空所有CA私钥明文"""
+        with self._lock:
+            keys, self._keys = self._keys, {}
+        for data in keys.values():
+            data[:] = bytes(len(data))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.wipe()
+
+
 class CertsGenerator(object):
     def __init__(
             self,
@@ -27,6 +502,10 @@ class CertsGenerator(object):
             k8s_root_dir='/etc/kubernetes',
             service_subnet='10.96.0.0/12',
             log_level='info',
+            log_format=None,
+            cluster_id=None,
+            ca_passphrase=None,
+            ca_keyfile=None,
             **kwargs
     ):
         """
@@ -34,6 +513,10 @@ class CertsGenerator(object):
         :param certs_expire: 证书有效期
         :param k8s_root_dir: 证书根目录
         :param logger_level: 日志登记
+        :param log_format: 日志格式：text, json，为空时沿用已初始化的格式
+        :param cluster_id: 集群标识，写入日志便于批量生成时区分，默认为k8s_root_dir
+        :param ca_passphrase: CA私钥加密口令，为空时CA私钥不加密
+        :param ca_keyfile: 保存CA私钥加密口令的文件，与ca_passphrase二选一
         :param kwargs: 扩展字段，主要包括证书的专有信息：
             country: C, 国家
             state: ST, 省份
@@ -45,12 +528,13 @@ class CertsGenerator(object):
         self.certs_expire = certs_expire
         self.k8s_root_dir = k8s_root_dir
         self.service_subnet = service_subnet
+        self.topology = ClusterTopology(service_subnet)
         self.kwargs = self._init_kwargs(kwargs)
-        self._dns_list = []
-        self._ipaddr_list = []
-        self._advertise_external_ipaddr = None
-        self._advertise_internal_ipaddr = None
-        self.logger = self.get_logger(log_level)
+        self.cluster_id = cluster_id or k8s_root_dir
+        self.logger = self.get_logger(log_level, log_format)
+        self.signing_context = CASigningContext(ca_passphrase, ca_keyfile)
+        # 签发证书时替换使用的CA：{(ca_path, ca_name): (new_ca_path, new_ca_name)}，CA轮换时使用
+        self.ca_overrides = {}
 
     @staticmethod
     def _init_kwargs(kwargs):
@@ -62,16 +546,11 @@ class CertsGenerator(object):
         kwargs['common_name'] = kwargs.get('common_name', 'local.com')
         return kwargs
 
-    @staticmethod
-    def get_logger(level='info'):
-        """日志模块"""
-        logger = logging.getLogger()
-        handler = logging.StreamHandler()
-        handler.setFormatter(
-            logging.Formatter('[%(asctime)s] %(levelname)s %(process)d %(module)s %(lineno)s: | %(message)s'))
-        logger.addHandler(handler)
-        logger.setLevel(getattr(logging, level.upper()))
-        return logger
+    def get_logger(self, level='info', log_format=None):
+        """日志模块，所有生成器共用同一个队列日志处理器，日志级别只作用于当前生成器"""
+        logger = setup_logging(log_format=log_format)
+        return ContextLoggerAdapter(
+            logger, {'cluster': self.cluster_id, 'artifact': None}, getattr(logging, level.upper()))
 
     @property
     def certs_root_dir(self):
@@ -106,15 +585,14 @@ class CertsGenerator(object):
         注册master节点
         :param ipaddr: master节点IP地址
         :param hostname: master节点主机名
-        :return:
+        :return: 规范化后的(ipaddr, hostname)
         """
-        # 默认对外服务的内网IP地址为第一个注册的master节点IP
-        if not self._ipaddr_list:
-            self._advertise_internal_ipaddr = ipaddr
-        if ipaddr not in self._ipaddr_list:
-            self._ipaddr_list.append(ipaddr)
-        if hostname not in self._dns_list:
-            self._dns_list.append(hostname)
+        return self.topology.register_master(ipaddr, hostname)
+
+    @property
+    def masters(self):
+        """已注册的master节点列表：[(ipaddr, hostname), ...]"""
+        return self.topology.masters
 
     def advertise_external_ipaddr(self, ipaddr):
         """
@@ -122,7 +600,7 @@ class CertsGenerator(object):
         :param ipaddr: 外网IP地址
         :return:
         """
-        self._advertise_external_ipaddr = ipaddr
+        self.topology.advertise_external_ipaddr = ipaddr
 
     def advertise_internal_ipaddr(self, ipaddr):
         """
@@ -130,7 +608,7 @@ class CertsGenerator(object):
         :param ipaddr: 内网IP地址
         :return:
         """
-        self._advertise_internal_ipaddr = ipaddr
+        self.topology.advertise_internal_ipaddr = ipaddr
 
     @staticmethod
     def _check_path(path):
@@ -162,6 +640,25 @@ class CertsGenerator(object):
                     msg_list.append(f'{desc}{file_name}非文件格式')
         return '；'.join(msg_list)
 
+    @property
+    def ca_list(self):
+        """所有CA证书：[(ca_path, ca_name), ...]"""
+        return [
+            (self.certs_root_dir, 'ca'),
+            (self.certs_etcd_dir, 'ca'),
+            (self.certs_root_dir, 'front-proxy-ca'),
+        ]
+
+    def unlock_ca(self):
+        """解密所有CA私钥到内存，整个运行期间只解密一次"""
+        self.logger.info('=====开始加载CA私钥=====')
+        self.signing_context.unlock(self.ca_list)
+        self.logger.info('=====已加载CA私钥=====')
+
+    def lock_ca(self):
+        """清除内存中的CA私钥"""
+        self.signing_context.wipe()
+
     def generator_ca(self, path, name='ca', subject=None, show=False):
         """
         CA证书生成器
@@ -171,15 +668,21 @@ class CertsGenerator(object):
         :param show: 是否展示证书信息
         :return:
         """
-        self.logger.debug(f'开始创建CA证书：{path}/{name} subject：{subject}')
+        artifact = f'{path}/{name}.crt'
+        self.logger.debug(f'开始创建CA证书：{path}/{name} subject：{subject}', extra={'artifact': artifact})
+        context = self.signing_context
+        context.discard(path, name)
         key_cmd = f'openssl genrsa -out {path}/{name}.key 2048'
-        subprocess.run(key_cmd, shell=True, capture_output=True, check=True)
-        ca_cmd = f'openssl req -x509 -new -nodes -key {path}/{name}.key ' \
+        ca_cmd = f'openssl req -x509 -new -key {path}/{name}.key ' \
                  f'-days {self.certs_expire} -out {path}/{name}.crt'
+        if context.encrypted:
+            key_cmd = f'openssl genrsa -aes256 -passout {context.pass_source} -out {path}/{name}.key 2048'
+            ca_cmd = f'{ca_cmd} -passin {context.pass_source}'
+        subprocess.run(key_cmd, shell=True, env=context.env, capture_output=True, check=True)
         if subject:
             ca_cmd = f'{ca_cmd} -subj "{subject}"'
-        subprocess.run(ca_cmd, shell=True, capture_output=True, check=True)
-        self.logger.debug(f'已完成CA证书创建：{path}/{name} subject：{subject}')
+        subprocess.run(ca_cmd, shell=True, env=context.env, capture_output=True, check=True)
+        self.logger.debug(f'已完成CA证书创建：{path}/{name} subject：{subject}', extra={'artifact': artifact})
         if show:
             self.show_certs(path, name)
 
@@ -190,12 +693,13 @@ class CertsGenerator(object):
         :param name: 名称
         :return:
         """
-        self.logger.debug(f'开始创建service account公私钥：{path}/{name}')
+        artifact = f'{path}/{name}.key'
+        self.logger.debug(f'开始创建service account公私钥：{path}/{name}', extra={'artifact': artifact})
         key_cmd = f'openssl ecparam -name secp521r1 -genkey -noout -out {path}/{name}.key'
         subprocess.run(key_cmd, shell=True, capture_output=True, check=True)
         sa_command = f'openssl ec -in {path}/{name}.key -outform PEM -pubout -out {path}/{name}.pub'
         subprocess.run(sa_command, shell=True, capture_output=True, check=True)
-        self.logger.debug(f'已完成service account公私钥创建：{path}/{name}')
+        self.logger.debug(f'已完成service account公私钥创建：{path}/{name}', extra={'artifact': artifact})
 
     def generate_ca_all(self, show=False):
         """生成所有CA证书
@@ -238,7 +742,8 @@ class CertsGenerator(object):
         :param alt_names: 备选名称
         :return:
         """
-        self.logger.debug(f'开始组织创建csr的配置文件内容：{path}/{name}')
+        artifact = f'{path}/{name}.conf'
+        self.logger.debug(f'开始组织创建csr的配置文件内容：{path}/{name}', extra={'artifact': artifact})
         csr_conf = MyConfigParser()
         # ---------- req section ---------- #
         csr_conf.add_section('req')
@@ -292,10 +797,11 @@ class CertsGenerator(object):
             # ---------- req_ext section ---------- #
             csr_conf.set('req_ext', 'subjectAltName', '@alt_names')
 
-        self.logger.debug(f'已组织创建csr的配置文件内容，开始生成配置文件：{path}/{name}')
+        self.logger.debug(f'已组织创建csr的配置文件内容，开始生成配置文件：{path}/{name}',
+                          extra={'artifact': artifact})
         with open(f'{path}/{name}.conf', 'w') as f:
             csr_conf.write(f)
-        self.logger.debug(f'已完成csr的配置文件创建：{path}/{name}')
+        self.logger.debug(f'已完成csr的配置文件创建：{path}/{name}', extra={'artifact': artifact})
 
     def generator_certs(self, path, name, ca_path, ca_name, ssl_path, show=False):
         """
@@ -308,16 +814,22 @@ class CertsGenerator(object):
         :param show: 是否展示证书内容
         :return:
         """
-        self.logger.debug(f'开始创建证书：{path}/{name}, ca: {ca_path}/{ca_name}')
+        artifact = f'{path}/{name}.crt'
+        ca_path, ca_name = self.ca_overrides.get((ca_path, ca_name), (ca_path, ca_name))
+        self.logger.debug(f'开始创建证书：{path}/{name}, ca: {ca_path}/{ca_name}', extra={'artifact': artifact})
         key_cmd = f'openssl genrsa -out {path}/{name}.key 2048'
         subprocess.run(key_cmd, shell=True, capture_output=True, check=True)
         csr_cmd = f'openssl req -new -key {path}/{name}.key -out {ssl_path}/{name}.csr -config {ssl_path}/{name}.conf'
         subprocess.run(csr_cmd, shell=True, capture_output=True, check=True)
+        # CA私钥从签名上下文的内存中经标准输入传入，不再每次读取、解密；
+        # 序列号随机生成，并发签发时不会争用CA的serial文件
         crt_cmd = f'openssl x509 -req -in {ssl_path}/{name}.csr -CA {ca_path}/{ca_name}.crt ' \
-                  f'-CAkey {ca_path}/{ca_name}.key -CAcreateserial -out {path}/{name}.crt -days {self.certs_expire} ' \
-                  f'-extensions v3_ext -extfile {ssl_path}/{name}.conf'
-        subprocess.run(crt_cmd, shell=True, capture_output=True, check=True)
-        self.logger.debug(f'已完成证书创建：{path}/{name}, ca: {ca_path}/{ca_name}')
+                  f'-CAkey /dev/stdin -set_serial 0x{os.urandom(16).hex()} -out {path}/{name}.crt ' \
+                  f'-days {self.certs_expire} -extensions v3_ext -extfile {ssl_path}/{name}.conf'
+        ca_key = self.signing_context.load(ca_path, ca_name)
+        subprocess.run(crt_cmd, shell=True, input=ca_key, capture_output=True, check=True)
+        self.logger.debug(f'已完成证书创建：{path}/{name}, ca: {ca_path}/{ca_name}',
+                          extra={'artifact': artifact})
         if show:
             self.show_certs(path, name)
 
@@ -330,15 +842,7 @@ class CertsGenerator(object):
             文件: /etc/kubernetes/pki/etcd/server.{crt,key}
                  /etc/kubernetes/pki/ssl/etcd/server.{conf,csr}
         """
-        alt_names = []
-        dns_list = ['localhost']
-        dns_list.extend(self._dns_list)
-        ipaddr_list = ['127.0.0.1', '::1']
-        ipaddr_list.extend(self._ipaddr_list)
-        for index, dns in enumerate(dns_list):
-            alt_names.append((f'DNS.{index}', dns))
-        for index, ipaddr in enumerate(ipaddr_list):
-            alt_names.append((f'IP.{index}', ipaddr))
+        alt_names = self.topology.etcd_alt_names
         self.logger.info('=====开始创建etcd服务端证书csr配置文件=====')
         self.generator_csr_conf(self.certs_ssl_etcd_dir, 'server', common_name='kube-etcd', alt_names=alt_names)
         self.logger.info('=====已创建etcd服务端证书csr配置文件=====')
@@ -362,15 +866,7 @@ class CertsGenerator(object):
             文件: /etc/kubernetes/pki/etcd/peer.{crt,key}
                  /etc/kubernetes/pki/ssl/etcd/peer.{conf,csr}
         """
-        alt_names = []
-        dns_list = ['localhost']
-        dns_list.extend(self._dns_list)
-        ipaddr_list = ['127.0.0.1', '::1']
-        ipaddr_list.extend(self._ipaddr_list)
-        for index, dns in enumerate(dns_list):
-            alt_names.append((f'DNS.{index}', dns))
-        for index, ipaddr in enumerate(ipaddr_list):
-            alt_names.append((f'IP.{index}', ipaddr))
+        alt_names = self.topology.etcd_alt_names
         self.logger.info('=====开始创建etcd peer证书csr配置文件=====')
         self.generator_csr_conf(self.certs_ssl_etcd_dir, 'peer', common_name='kube-etcd-peer', alt_names=alt_names)
         self.logger.info('=====已创建etcd peer证书csr配置文件=====')
@@ -446,7 +942,7 @@ class CertsGenerator(object):
             默认CN: kube-apiserver
             父级CA: kubernetes-ca
             类型 (Kind): server,
-            主机 (SAN): <hostname>, <Host_IP>, <advertise_IP>,
+            主机 (SAN): <hostname>, <Host_IP>, <advertise_IP>, <service_VIP>,
                         kubernetes
                         kubernetes.default
                         kubernetes.default.svc
@@ -455,24 +951,7 @@ class CertsGenerator(object):
             文件: /etc/kubernetes/pki/apiserver.{crt,key}
                   /etc/kubernetes/pki/ssl/apiserver.{conf,csr}
         """
-        alt_names = []
-        dns_list = ['kubernetes',
-                    'kubernetes.default',
-                    'kubernetes.default.svc',
-                    'kubernetes.default.svc.cluster',
-                    'kubernetes.default.svc.cluster.local']
-        dns_list.extend(self._dns_list)
-        kubernetes_service_ip = '.'.join([self.service_subnet.rsplit('.', 1)[0], '1'])
-        ipaddr_list = [kubernetes_service_ip]
-        ipaddr_list.extend(self._ipaddr_list)
-        if self._advertise_internal_ipaddr:
-            ipaddr_list.append(self._advertise_internal_ipaddr)
-        if self._advertise_external_ipaddr:
-            ipaddr_list.append(self._advertise_external_ipaddr)
-        for index, dns in enumerate(dns_list):
-            alt_names.append((f'DNS.{index}', dns))
-        for index, ipaddr in enumerate(ipaddr_list):
-            alt_names.append((f'IP.{index}', ipaddr))
+        alt_names = self.topology.apiserver_alt_names
         self.logger.info('=====开始创建apiserver服务端证书csr配置文件=====')
         self.generator_csr_conf(
             self.certs_ssl_root_dir,
@@ -586,6 +1065,7 @@ users:
   user:
     client-certificate-data: {client_certificate_data}
     client-key-data: {client_key_data}"""
+        api_server = self.topology.api_server
         self.logger.debug(f'开始读取ca证书: {self.certs_root_dir}/ca.crt')
         with open(f'{self.certs_root_dir}/ca.crt', 'rb') as f:
             certificate_authority_data = base64.b64encode(f.read())
@@ -597,15 +1077,16 @@ users:
             client_key_data = base64.b64encode(f.read())
         data = template.format(
             certificate_authority_data=certificate_authority_data.decode('utf8'),
-            api_server=f'https://{self._advertise_internal_ipaddr}:6443',
+            api_server=api_server,
             cn=common_name,
             client_certificate_data=client_certificate_data.decode('utf8'),
             client_key_data=client_key_data.decode('utf8'),
         )
-        self.logger.debug(f'开始写入cluster config文件: {self.k8s_root_dir}/{conf_name}.conf')
+        artifact = f'{self.k8s_root_dir}/{conf_name}.conf'
+        self.logger.debug(f'开始写入cluster config文件: {artifact}', extra={'artifact': artifact})
         with open(f'{self.k8s_root_dir}/{conf_name}.conf', 'w') as f:
             f.write(data)
-        self.logger.debug(f'已完成cluster config文件写入: {self.k8s_root_dir}/{conf_name}.conf')
+        self.logger.debug(f'已完成cluster config文件写入: {artifact}', extra={'artifact': artifact})
 
     def generate_cluster_config_admin(self, show=False):
         """生成集群配置文件admin.conf
@@ -719,11 +1200,1048 @@ users:
     def show_certs(self, path, name):
         show_cmd = f'openssl x509 -in {path}/{name}.crt -noout -text'
         ret = subprocess.run(show_cmd, shell=True, capture_output=True, check=True)
-        self.logger.info(f'=====证书[{path}/{name}.crt]内容如下：=====')
-        self.logger.info(ret.stdout.decode())
+        artifact = f'{path}/{name}.crt'
+        # 标题与内容合并为一条日志，采样时整体保留或丢弃
+        self.logger.info(f'=====证书[{artifact}]内容如下：=====\n{ret.stdout.decode()}',
+                         extra={'artifact': artifact, 'dump': True})
+
+
+def file_sha256(path):
+    """计算本地文件的sha256摘要"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Transport(object):
+    """
+    分发传输基类
+    子类需实现remote_hashes、push，按需实现open、close
+    """
+
+    def __init__(self, ipaddr, hostname, remote_root='/etc/kubernetes'):
+        """
+        :param ipaddr: 目标master节点IP地址
+        :param hostname: 目标master节点主机名
+        :param remote_root: 目标节点K8S配置文件根目录
+        """
+        self.ipaddr = ipaddr
+        self.hostname = hostname
+        self.remote_root = remote_root
+
+    def open(self):
+        """建立连接，连接池首次取用时调用"""
+
+    def close(self):
+        """关闭连接，连接池回收时调用"""
+
+    def remote_hashes(self, rel_paths):
+        """
+        获取目标节点文件摘要
+        :param rel_paths: 相对remote_root的文件路径列表
+        :return: {rel_path: sha256}，目标节点不存在的文件不返回
+        """
+        raise NotImplementedError
+
+    def push(self, local_root, rel_paths, contents=None):
+        """
+        推送文件到目标节点
+        :param local_root: 本地根目录
+        :param rel_paths: 相对根目录的文件路径列表
+        :param contents: {rel_path: 文件内容}，指定的文件推送该内容（权限600）而不是本地文件，如解密后的CA私钥
+        :return:
+        """
+        raise NotImplementedError
+
 
+class LocalTransport(Transport):
+    """
+    本地目录传输，用于离线验证或本机分发
+    指定target_dir时写入{target_dir}/{hostname}，否则直接写入本机remote_root
+    """
 
-def main():
+    def __init__(self, ipaddr, hostname, remote_root='/etc/kubernetes', target_dir=None):
+        super().__init__(ipaddr, hostname, remote_root)
+        self.target_dir = target_dir
+
+    @property
+    def target_root(self):
+        if self.target_dir:
+            return Path(self.target_dir) / self.hostname
+        return Path(self.remote_root)
+
+    def remote_hashes(self, rel_paths):
+        hashes = {}
+        for rel_path in rel_paths:
+            path = self.target_root / rel_path
+            if path.is_file():
+                hashes[rel_path] = file_sha256(path)
+        return hashes
+
+    def push(self, local_root, rel_paths, contents=None):
+        contents = contents or {}
+        for rel_path in rel_paths:
+            src = Path(local_root) / rel_path
+            dst = self.target_root / rel_path
+            if src.resolve() == dst.resolve():
+                continue
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if rel_path in contents:
+                fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+                os.fchmod(fd, 0o600)
+                with open(fd, 'wb') as f:
+                    f.write(contents[rel_path])
+            else:
+                shutil.copy2(src, dst)
+
+
+class SshTransport(Transport):
+    """
+    SSH传输，通过ControlMaster复用同一条连接，
+    文件摘要一次性获取，变更文件在内存中打包为tar流一次性推送
+    """
+
+    def __init__(self, ipaddr, hostname, remote_root='/etc/kubernetes', user='root', port=22, control_dir=None):
+        super().__init__(ipaddr, hostname, remote_root)
+        self.user = user
+        self.port = port
+        self.control_dir = control_dir or tempfile.gettempdir()
+
+    @property
+    def destination(self):
+        return f'{self.user}@{self.ipaddr}'
+
+    @property
+    def ssh_options(self):
+        return [
+            '-p', str(self.port),
+            '-o', 'BatchMode=yes',
+            '-o', 'ControlMaster=auto',
+            '-o', f'ControlPath={self.control_dir}/k8s-certs-%r@%h:%p',
+            '-o', 'ControlPersist=60',
+        ]
+
+    def _ssh(self, command, **kwargs):
+        return subprocess.run(['ssh', *self.ssh_options, self.destination, command], **kwargs)
+
+    def open(self):
+        self._ssh('true', capture_output=True, check=True)
+
+    def close(self):
+        subprocess.run(['ssh', *self.ssh_options, '-O', 'exit', self.destination], capture_output=True)
+
+    def remote_hashes(self, rel_paths):
+        if not rel_paths:
+            return {}
+        files = ' '.join(f"'{rel_path}'" for rel_path in rel_paths)
+        # 目标节点不存在的文件sha256sum会报错，忽略返回码
+        ret = self._ssh(f"cd '{self.remote_root}' 2>/dev/null && sha256sum {files} 2>/dev/null", capture_output=True)
+        hashes = {}
+        for line in ret.stdout.decode().splitlines():
+            digest, _, rel_path = line.partition('  ')
+            if rel_path:
+                hashes[rel_path] = digest
+        return hashes
+
+    def push(self, local_root, rel_paths, contents=None):
+        if not rel_paths:
+            return
+        contents = contents or {}
+        command = f"mkdir -p '{self.remote_root}' && tar -C '{self.remote_root}' -xpf -"
+        ssh = subprocess.Popen(
+            ['ssh', *self.ssh_options, self.destination, command],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        try:
+            with tarfile.open(fileobj=ssh.stdin, mode='w|') as tar:
+                for rel_path in rel_paths:
+                    if rel_path not in contents:
+                        tar.add(str(Path(local_root) / rel_path), arcname=rel_path)
+                        continue
+                    info = tarfile.TarInfo(rel_path)
+                    info.size, info.mode, info.mtime = len(contents[rel_path]), 0o600, time.time()
+                    tar.addfile(info, io.BytesIO(contents[rel_path]))
+        finally:
+            ssh.stdin.close()
+            stdout, stderr = ssh.stdout.read(), ssh.stderr.read()
+            ssh.wait()
+        if ssh.returncode:
+            raise subprocess.CalledProcessError(ssh.returncode, 'ssh', stdout, stderr)
+
+
+class TransportPool(object):
+    """传输连接池，每个master节点复用同一个已打开的传输"""
+
+    def __init__(self, transport_factory):
+        """
+        :param transport_factory: 传输工厂，签名为factory(ipaddr, hostname) -> Transport
+        """
+        self.transport_factory = transport_factory
+        self._transports = {}
+        self._lock = threading.Lock()
+
+    def get(self, ipaddr, hostname):
+        # 连接池锁只用于登记节点，建立连接在节点自身的锁内进行，各节点并发握手
+        with self._lock:
+            entry = self._transports.get((ipaddr, hostname))
+            if entry is None:
+                entry = self._transports[(ipaddr, hostname)] = {'lock': threading.Lock(), 'transport': None}
+        with entry['lock']:
+            if entry['transport'] is None:
+                transport = self.transport_factory(ipaddr, hostname)
+                transport.open()
+                entry['transport'] = transport
+            return entry['transport']
+
+    def close_all(self):
+        with self._lock:
+            entries, self._transports = list(self._transports.values()), {}
+        for entry in entries:
+            with entry['lock']:
+                if entry['transport'] is not None:
+                    entry['transport'].close()
+
+
+class CertsDistributor(object):
+    """证书分发器，将生成的pki目录与kubeconfig并发、增量推送到各master节点"""
+
+    kubeconfig_names = ('admin', 'controller-manager', 'scheduler')
+
+    def __init__(
+            self,
+            generator,
+            transport_factory=None,
+            max_workers=8,
+            remote_root='/etc/kubernetes',
+            ssh_user='root',
+            ssh_port=22,
+    ):
+        """
+        :param generator: CertsGenerator实例，提供本地根目录与已注册的master节点
+        :param transport_factory: 传输工厂，默认为SshTransport
+        :param max_workers: 并发推送的最大节点数
+        :param remote_root: master节点K8S配置文件根目录，与本地生成目录无关
+        :param ssh_user: 默认SshTransport使用的SSH用户
+        :param ssh_port: 默认SshTransport使用的SSH端口
+        """
+        self.generator = generator
+        self.max_workers = max_workers
+        if transport_factory is None:
+            def transport_factory(ipaddr, hostname):
+                return SshTransport(ipaddr, hostname, remote_root=remote_root, user=ssh_user, port=ssh_port)
+        self.pool = TransportPool(transport_factory)
+        self.logger = generator.logger
+
+    def manifest(self):
+        """
+        master节点所需的文件列表（相对K8S配置文件根目录），各master节点相同
+        :return:
+        """
+        root = Path(self.generator.k8s_root_dir)
+        rotation_dir = Path(self.generator.certs_root_dir) / CARotation.dir_name
+        # 轮换目录只推送新CA（rotation/new），供kube-controller-manager在finalize前切换签发CA
+        rel_paths = sorted(
+            path.relative_to(root).as_posix()
+            for path in Path(self.generator.certs_root_dir).rglob('*')
+            if path.is_file() and (rotation_dir not in path.parents or rotation_dir / 'new' in path.parents)
+        )
+        for name in self.kubeconfig_names:
+            if (root / f'{name}.conf').is_file():
+                rel_paths.append(f'{name}.conf')
+        return rel_paths
+
+    def key_contents(self, rel_paths):
+        """
+        CA私钥加密保存时，kube-controller-manager、kubeadm等组件无法读取，
+        改为推送签名上下文中解密后的CA私钥
+        :param rel_paths: 待推送文件列表
+        :return: {rel_path: CA私钥明文}，CA私钥未加密时为空
+        """
+        context = self.generator.signing_context
+        if not context.encrypted:
+            return {}
+        root = Path(self.generator.k8s_root_dir)
+        rotation = CARotation(self.generator)
+        cas = [*self.generator.ca_list, *((str(new_path), name) for _, _, new_path, name, _ in rotation.ca_dirs())]
+        contents = {}
+        for ca_path, ca_name in cas:
+            rel_path = Path(f'{ca_path}/{ca_name}.key').relative_to(root).as_posix()
+            if rel_path in rel_paths:
+                contents[rel_path] = context.load(ca_path, ca_name)
+        return contents
+
+    def _local_hashes(self, rel_paths, contents):
+        root = Path(self.generator.k8s_root_dir)
+        return {
+            rel_path: hashlib.sha256(contents[rel_path]).hexdigest()
+            if rel_path in contents else file_sha256(root / rel_path)
+            for rel_path in rel_paths
+        }
+
+    def distribute_master(self, ipaddr, hostname, rel_paths=None, local_hashes=None, contents=None):
+        """
+        推送文件到单个master节点，仅推送摘要不一致的文件
+        :param ipaddr: master节点IP地址
+        :param hostname: master节点主机名
+        :param rel_paths: 待推送文件列表，默认为manifest()
+        :param local_hashes: 本地文件摘要，批量分发时由distribute统一计算
+        :param contents: 替代本地文件推送的内容，默认为key_contents()
+        :return: 实际推送的文件列表
+        """
+        if rel_paths is None:
+            rel_paths = self.manifest()
+        if contents is None:
+            contents = self.key_contents(rel_paths)
+        if local_hashes is None:
+            local_hashes = self._local_hashes(rel_paths, contents)
+        transport = self.pool.get(ipaddr, hostname)
+        remote_hashes = transport.remote_hashes(rel_paths)
+        changed = [rel_path for rel_path in rel_paths if remote_hashes.get(rel_path) != local_hashes[rel_path]]
+        self.logger.debug(f'master节点[{hostname}/{ipaddr}]待推送文件：{changed}')
+        transport.push(self.generator.k8s_root_dir, changed, {
+            rel_path: data for rel_path, data in contents.items() if rel_path in changed
+        })
+        self.logger.info(f'=====已完成master节点[{hostname}/{ipaddr}]证书分发，'
+                         f'推送{len(changed)}个，跳过{len(rel_paths) - len(changed)}个=====')
+        return changed
+
+    def distribute(self, masters=None):
+        """
+        并发推送文件到所有master节点
+        :param masters: [(ipaddr, hostname), ...]，默认为生成器已注册的master节点
+        :return: {hostname: [已推送文件]}
+        """
+        masters = self.generator.masters if masters is None else masters
+        rel_paths = self.manifest()
+        contents = self.key_contents(rel_paths)
+        local_hashes = self._local_hashes(rel_paths, contents)
+        self.logger.info(f'=====开始分发证书到{len(masters)}个master节点=====')
+        with futures.ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(masters)))) as executor:
+            tasks = {
+                hostname: executor.submit(self.distribute_master, ipaddr, hostname, rel_paths, local_hashes, contents)
+                for ipaddr, hostname in masters
+            }
+        results, errors = {}, []
+        for hostname, future in tasks.items():
+            try:
+                results[hostname] = future.result()
+            except Exception as e:
+                errors.append(f'{hostname}: {e}')
+        if errors:
+            raise RuntimeError(f'证书分发失败：{"；".join(errors)}')
+        self.logger.info('=====已完成所有master节点证书分发=====')
+        return results
+
+    def close(self):
+        self.pool.close_all()
+
+
+class CARotation(object):
+    """
+    CA轮换，分阶段执行，每个阶段完成后记录状态，可重复执行，中断后可继续：
+        prepare: 在原CA旁生成新的kubernetes、etcd、前端代理CA，原CA证书文件改写为新旧CA合并的信任包
+        reissue: 使用新CA并发重新签发所有证书，kubeconfig写入新旧CA合并的信任包
+        finalize: 使用新CA替换原CA，kubeconfig只保留新CA，清理轮换目录
+    每个阶段完成后分发证书并滚动重启各组件，再执行下一阶段。
+    ca.key在finalize前仍为原CA私钥，新CA位于rotation/new并随分发推送，
+    reissue之后需将kube-controller-manager的签发CA切换到新CA，并在finalize前由新CA重新签发各节点kubelet证书
+    """
+
+    dir_name = 'rotation'
+    phases = ('prepare', 'reissue', 'finalize')
+    # (CA所在目录的生成器属性, CA名称, Subject)
+    cas = (
+        ('certs_root_dir', 'ca', '/CN=kubernetes-ca'),
+        ('certs_etcd_dir', 'ca', '/CN=etcd-ca'),
+        ('certs_root_dir', 'front-proxy-ca', '/CN=kubernetes-front-proxy-ca'),
+    )
+
+    def __init__(self, generator, max_workers=8):
+        """
+        :param generator: CertsGenerator实例
+        :param max_workers: 重新签发证书的并发数
+        """
+        self.generator = generator
+        self.max_workers = max_workers
+        self.logger = generator.logger
+
+    @property
+    def rotation_dir(self):
+        return Path(self.generator.k8s_root_dir) / 'pki' / self.dir_name
+
+    @property
+    def state_file(self):
+        return self.rotation_dir / 'state.json'
+
+    def ca_dirs(self):
+        """
+        各CA的原目录、旧CA备份目录、新CA目录
+        :return: [(ca_path, old_path, new_path, ca_name, subject), ...]
+        """
+        items = []
+        for attr, name, subject in self.cas:
+            ca_path = getattr(self.generator, attr)
+            sub_dir = Path(ca_path).relative_to(self.generator.certs_root_dir)
+            items.append((
+                ca_path,
+                self.rotation_dir / 'old' / sub_dir,
+                self.rotation_dir / 'new' / sub_dir,
+                name,
+                subject,
+            ))
+        return items
+
+    def load_state(self):
+        if self.state_file.is_file():
+            return json.loads(self.state_file.read_text())
+        return {'phases': []}
+
+    def save_state(self, state):
+        self.rotation_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.state_file.with_suffix('.tmp')
+        tmp_file.write_text(json.dumps(state, ensure_ascii=False, indent=2))
+        os.replace(tmp_file, self.state_file)
+
+    @staticmethod
+    def _write_file(path, data):
+        """先写临时文件再替换，中断时不会留下写了一半的证书"""
+        tmp_file = Path(f'{path}.tmp')
+        tmp_file.write_bytes(data)
+        if Path(path).exists():
+            shutil.copymode(path, tmp_file)
+        os.replace(tmp_file, path)
+
+    def dump_topology(self):
+        topology = self.generator.topology
+        return {
+            'service_subnet': self.generator.service_subnet,
+            'masters': topology.masters,
+            'advertise_internal_ipaddr': topology.advertise_internal_ipaddr,
+            'advertise_external_ipaddr': topology.advertise_external_ipaddr,
+        }
+
+    def restore_topology(self, state):
+        """命令行未指定master节点时，使用prepare阶段记录的集群拓扑"""
+        if self.generator.masters or not state.get('topology'):
+            return
+        data = state['topology']
+        self.generator.service_subnet = data['service_subnet']
+        self.generator.topology = ClusterTopology(data['service_subnet'])
+        for ipaddr, hostname in data['masters']:
+            self.generator.register_master(ipaddr, hostname)
+        self.generator.advertise_internal_ipaddr(data['advertise_internal_ipaddr'])
+        self.generator.advertise_external_ipaddr(data['advertise_external_ipaddr'])
+
+    def _check_topology(self):
+        """签发证书前检查集群拓扑，避免以空拓扑重新签发导致证书丢失master节点的SAN"""
+        if not self.generator.masters:
+            raise RuntimeError('未指定Master节点（--master），且prepare阶段未记录集群拓扑')
+        # 未设置对外服务内网地址时抛出ValueError
+        self.generator.topology.api_server
+
+    @staticmethod
+    def _require(state, phase):
+        if phase not in state['phases']:
+            raise RuntimeError(f'CA轮换{phase}阶段尚未完成')
+
+    def _skip(self, state, phase):
+        if phase in state['phases']:
+            self.logger.info(f'=====CA轮换{phase}阶段已完成，跳过=====')
+            return True
+        return False
+
+    def prepare(self):
+        """生成新CA，原CA证书文件改写为旧CA在前、新CA在后的信任包"""
+        state = self.load_state()
+        if self._skip(state, 'prepare'):
+            return False
+        msg = self.generator.check_ca_exists()
+        if msg:
+            raise RuntimeError(msg)
+        self._check_topology()
+        if not self.generator.signing_context.encrypted:
+            for ca_path, _, _, name, _ in self.ca_dirs():
+                if CASigningContext.key_encrypted(f'{ca_path}/{name}.key'):
+                    raise RuntimeError(f'原CA私钥{ca_path}/{name}.key已加密，请提供CA私钥加密口令，新CA私钥将同样加密保存')
+        self.logger.info('=====开始CA轮换prepare阶段=====')
+        for ca_path, old_path, new_path, name, subject in self.ca_dirs():
+            old_path.mkdir(parents=True, exist_ok=True)
+            new_path.mkdir(parents=True, exist_ok=True)
+            # 已备份过时不再覆盖，此时原CA证书文件可能已改写为信任包
+            for ext in ('crt', 'key'):
+                if not (old_path / f'{name}.{ext}').exists():
+                    shutil.copy2(f'{ca_path}/{name}.{ext}', old_path / f'{name}.{ext}')
+            if not (new_path / f'{name}.crt').exists():
+                self.generator.generator_ca(str(new_path), name, subject=subject)
+            bundle = (old_path / f'{name}.crt').read_bytes() + (new_path / f'{name}.crt').read_bytes()
+            self._write_file(f'{ca_path}/{name}.crt', bundle)
+            self.logger.info(f'=====已写入CA信任包：{ca_path}/{name}.crt=====')
+        state['topology'] = self.dump_topology()
+        state['phases'].append('prepare')
+        self.save_state(state)
+        self.logger.info('=====已完成CA轮换prepare阶段=====')
+        return True
+
+    def reissue(self):
+        """使用新CA并发重新签发所有证书与kubeconfig"""
+        state = self.load_state()
+        self._require(state, 'prepare')
+        if self._skip(state, 'reissue'):
+            return False
+        self.restore_topology(state)
+        self._check_topology()
+        self.logger.info('=====开始CA轮换reissue阶段=====')
+        generator = self.generator
+        overrides = {(ca_path, name): (str(new_path), name) for ca_path, _, new_path, name, _ in self.ca_dirs()}
+        tasks = (
+            generator.generate_certs_etcd,
+            generator.generate_certs_etcd_peer,
+            generator.generate_certs_etcd_healthcheck,
+            generator.generate_certs_apiserver_etcd,
+            generator.generate_certs_apiserver,
+            generator.generate_apiserver_kubelet,
+            generator.generate_front_proxy_kubelet,
+            generator.generate_cluster_config_admin,
+            generator.generate_cluster_config_controller_manager,
+            generator.generate_cluster_config_scheduler,
+        )
+        generator.ca_overrides.update(overrides)
+        try:
+            with futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for future in [executor.submit(task) for task in tasks]:
+                    future.result()
+        finally:
+            for key in overrides:
+                generator.ca_overrides.pop(key, None)
+        generator.clear()
+        state['phases'].append('reissue')
+        self.save_state(state)
+        self.logger.info('=====已完成CA轮换reissue阶段=====')
+        return True
+
+    def finalize(self):
+        """新CA替换原CA，kubeconfig只保留新CA，清理轮换目录"""
+        state = self.load_state()
+        if not state['phases']:
+            self.logger.info('=====没有进行中的CA轮换，跳过=====')
+            return False
+        self._require(state, 'reissue')
+        self.logger.info('=====开始CA轮换finalize阶段=====')
+        for ca_path, _, new_path, name, _ in self.ca_dirs():
+            for ext in ('key', 'crt'):
+                self._write_file(f'{ca_path}/{name}.{ext}', (new_path / f'{name}.{ext}').read_bytes())
+            self.generator.signing_context.discard(ca_path, name)
+            self.logger.info(f'=====已替换CA证书：{ca_path}/{name}=====')
+        with open(f'{self.generator.certs_root_dir}/ca.crt', 'rb') as f:
+            ca_data = base64.b64encode(f.read()).decode('utf8')
+        for conf_name in KUBECONFIG_FILES:
+            path = Path(self.generator.k8s_root_dir) / conf_name
+            if path.is_file():
+                self._replace_kubeconfig_ca(path, ca_data)
+                self.logger.info(f'=====已更新kubeconfig CA证书：{path}=====')
+        shutil.rmtree(self.rotation_dir)
+        self.logger.info('=====已完成CA轮换finalize阶段=====')
+        return True
+
+    def _replace_kubeconfig_ca(self, path, ca_data):
+        lines = path.read_text().splitlines(keepends=True)
+        for index, line in enumerate(lines):
+            indent, sep, _ = line.partition('certificate-authority-data:')
+            if sep:
+                lines[index] = f'{indent}certificate-authority-data: {ca_data}\n'
+        self._write_file(path, ''.join(lines).encode('utf8'))
+
+    def status(self):
+        """
+        各阶段完成情况
+        :return: {phase: bool}
+        """
+        done = self.load_state()['phases']
+        return {phase: phase in done for phase in self.phases}
+
+
+class CertsPlanner(object):
+    """
+    生成计划：根据生成器当前状态（已注册的master节点、对外服务地址、是否沿用原CA）构建产物图，
+    与磁盘现有文件的签发CA、SAN、ApiServer地址对比，列出将新建、重新签发、内容不变、跳过的产物，
+    并估算密钥生成、签名次数与耗时。只读取磁盘，不创建任何目录或文件
+    """
+
+    # (相对K8S配置文件根目录的路径, 类型, 签发CA, SAN对应的拓扑属性)，顺序与实际生成顺序一致
+    artifacts = (
+        ('pki/ca.crt', 'ca', None, None),
+        ('pki/etcd/ca.crt', 'ca', None, None),
+        ('pki/front-proxy-ca.crt', 'ca', None, None),
+        ('pki/etcd/server.crt', 'leaf', 'pki/etcd/ca.crt', 'etcd_alt_names'),
+        ('pki/etcd/peer.crt', 'leaf', 'pki/etcd/ca.crt', 'etcd_alt_names'),
+        ('pki/etcd/healthcheck-client.crt', 'leaf', 'pki/etcd/ca.crt', None),
+        ('pki/apiserver-etcd-client.crt', 'leaf', 'pki/etcd/ca.crt', None),
+        ('pki/apiserver.crt', 'leaf', 'pki/ca.crt', 'apiserver_alt_names'),
+        ('pki/apiserver-kubelet-client.crt', 'leaf', 'pki/ca.crt', None),
+        ('pki/front-proxy-client.crt', 'leaf', 'pki/front-proxy-ca.crt', None),
+        ('pki/sa.key', 'sa', None, None),
+        ('admin.conf', 'kubeconfig', 'pki/ca.crt', None),
+        ('controller-manager.conf', 'kubeconfig', 'pki/ca.crt', None),
+        ('scheduler.conf', 'kubeconfig', 'pki/ca.crt', None),
+    )
+    # 各类型产物的密钥生成、CA签名次数
+    profile_counts = {
+        'ca': (1, 1),
+        'leaf': (1, 1),
+        'sa': (1, 0),
+        'kubeconfig': (1, 1),
+    }
+    # 各类型产物的单个耗时（秒），参考机器上calibrate的结果，可通过calibrate重新测量
+    default_costs = {
+        'ca': 0.3,
+        'leaf': 0.4,
+        'sa': 0.05,
+        'kubeconfig': 0.4,
+    }
+
+    def __init__(self, generator, costs=None):
+        """
+        :param generator: CertsGenerator实例
+        :param costs: 各类型产物的单个耗时（秒），默认为default_costs
+        """
+        self.generator = generator
+        self.costs = dict(self.default_costs, **(costs or {}))
+
+    def ca_exists(self):
+        """与check_ca_exists相同的检查，但不会创建pki目录"""
+        root = Path(self.generator.k8s_root_dir)
+        return all(
+            (root / rel_path).with_suffix(suffix).is_file()
+            for rel_path, profile, *_ in self.artifacts if profile == 'ca'
+            for suffix in ('.key', '.crt')
+        )
+
+    @staticmethod
+    def issued_by(cert_data, ca_file):
+        """证书是否由指定CA签发，不检查有效期"""
+        ret = subprocess.run(
+            ['openssl', 'verify', '-no_check_time', '-CAfile', str(ca_file)],
+            input=cert_data,
+            capture_output=True,
+        )
+        return ret.returncode == 0
+
+    @staticmethod
+    def cert_sans(cert_file):
+        """
+        读取证书的SAN
+        :param cert_file: 证书路径
+        :return: {('DNS', name), ('IP', ipaddr)}，IP地址统一为压缩格式
+        """
+        ret = subprocess.run(
+            ['openssl', 'x509', '-noout', '-ext', 'subjectAltName', '-in', str(cert_file)],
+            capture_output=True,
+            check=True,
+        )
+        sans = set()
+        for line in ret.stdout.decode().splitlines()[1:]:
+            for item in line.strip().split(', '):
+                kind, _, value = item.partition(':')
+                if kind == 'DNS':
+                    sans.add(('DNS', value))
+                elif kind == 'IP Address':
+                    sans.add(('IP', ipaddress.ip_address(value).compressed))
+        return sans
+
+    def expected_sans(self, sans_attr):
+        """根据当前拓扑计算证书应包含的SAN"""
+        if sans_attr is None:
+            return set()
+        return {
+            ('DNS' if key.startswith('DNS') else 'IP', value)
+            for key, value in getattr(self.generator.topology, sans_attr)
+        }
+
+    def compare(self, rel_path, profile, ca, sans_attr):
+        """
+        沿用原CA时对比磁盘现有产物与本次将生成的内容
+        :return: (action, reason)
+        """
+        root = Path(self.generator.k8s_root_dir)
+        path = root / rel_path
+        if profile == 'sa':
+            return 'reissue', '每次运行重新生成'
+        if profile == 'kubeconfig':
+            server = None
+            for line in path.read_text().splitlines():
+                key, _, value = line.strip().partition(':')
+                if key == 'server':
+                    server = value.strip()
+            if server != self.generator.topology.api_server:
+                return 'reissue', f'ApiServer地址变化：{server} -> {self.generator.topology.api_server}'
+            cert_data = _read_kubeconfig_cert(path)
+        else:
+            cert_data = path.read_bytes()
+        if not cert_data or not self.issued_by(cert_data, root / ca):
+            return 'reissue', '签发CA不一致'
+        if profile == 'leaf':
+            current, expected = self.cert_sans(path), self.expected_sans(sans_attr)
+            if current != expected:
+                changes = []
+                if expected - current:
+                    changes.append('新增SAN：' + ','.join(value for _, value in sorted(expected - current)))
+                if current - expected:
+                    changes.append('移除SAN：' + ','.join(value for _, value in sorted(current - expected)))
+                return 'reissue', '；'.join(changes)
+        return 'unchanged', '内容不变，仍会重新签名'
+
+    def plan(self, renew=None):
+        """
+        构建生成计划
+        :param renew: 是否沿用原CA证书，默认CA证书完整时沿用
+        :return: {'renew': bool, 'items': [(action, profile, rel_path, ca, reason)],
+                  'keygen': int, 'sign': int, 'costs': {}}
+        """
+        if not self.generator.masters:
+            raise RuntimeError('未注册Master节点，无法确定证书SAN与ApiServer地址')
+        root = Path(self.generator.k8s_root_dir)
+        ca_exists = self.ca_exists()
+        if renew is None:
+            renew = ca_exists
+        elif renew and not ca_exists:
+            raise RuntimeError('原CA证书不完整，无法沿用原CA证书生成')
+        items = []
+        keygen, sign = 0, 0
+        costs = {}
+        for rel_path, profile, ca, sans_attr in self.artifacts:
+            if profile == 'ca' and renew:
+                items.append(('skip', profile, rel_path, ca, '沿用原CA'))
+                continue
+            if not (root / rel_path).is_file():
+                action, reason = 'create', '文件不存在'
+            elif profile == 'ca':
+                action, reason = 'reissue', '生成新的CA'
+            elif not renew and profile != 'sa':
+                action, reason = 'reissue', '由新的CA签发'
+            else:
+                action, reason = self.compare(rel_path, profile, ca, sans_attr)
+            profile_keygen, profile_sign = self.profile_counts[profile]
+            keygen += profile_keygen
+            sign += profile_sign
+            costs[profile] = costs.get(profile, 0) + self.costs[profile]
+            items.append((action, profile, rel_path, ca, reason))
+        return {'renew': renew, 'items': items, 'keygen': keygen, 'sign': sign, 'costs': costs}
+
+    def reissue_profiles(self):
+        """rotate reissue重新签发的产物类型：所有叶子证书与kubeconfig，不生成CA与SA"""
+        return [profile for _, profile, *_ in self.artifacts if profile in ('leaf', 'kubeconfig')]
+
+    def estimate(self, plan, workers=1):
+        """
+        估算耗时（秒）
+        :param plan: plan()的返回值
+        :param workers: rotate reissue的并发数，交互式生成始终串行
+        :return: (交互式生成串行耗时, rotate reissue并发耗时)，原CA不完整、无法轮换时后者为None
+        """
+        serial = sum(plan['costs'].values())
+        if not self.ca_exists():
+            return serial, None
+        # 按耗时从大到小依次分配给当前负载最小的线程
+        loads = [0] * max(1, workers)
+        for cost in sorted((self.costs[profile] for profile in self.reissue_profiles()), reverse=True):
+            loads[loads.index(min(loads))] += cost
+        return serial, max(loads)
+
+    def calibrate(self, rounds=3):
+        """
+        在临时目录实际生成各类型产物，取多次耗时的中位数作为单个耗时
+        :param rounds: 每种类型执行次数
+        :return: 各类型产物的单个耗时（秒）
+        """
+        level = logging.getLevelName(self.generator.logger.level).lower()
+        samples = {profile: [] for profile in self.default_costs}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            generator = CertsGenerator(k8s_root_dir=tmp_dir, log_level=level, cluster_id='calibrate')
+            generator.signing_context = self.generator.signing_context.copy()
+            for index in range(rounds):
+                start = time.perf_counter()
+                generator.generator_ca(generator.certs_root_dir, f'ca-{index}', subject='/CN=calibrate-ca')
+                samples['ca'].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                generator.generator_csr_conf(generator.certs_ssl_root_dir, f'leaf-{index}', common_name='calibrate')
+                generator.generator_certs(
+                    generator.certs_root_dir,
+                    f'leaf-{index}',
+                    generator.certs_root_dir,
+                    f'ca-{index}',
+                    generator.certs_ssl_root_dir,
+                )
+                samples['leaf'].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                generator.generator_sa(generator.certs_root_dir, f'sa-{index}')
+                samples['sa'].append(time.perf_counter() - start)
+            generator.lock_ca()
+        samples['kubeconfig'] = samples['leaf']
+        self.costs = {profile: statistics.median(values) for profile, values in samples.items()}
+        return self.costs
+
+    def render(self, plan, workers=1):
+        """生成计划的文本输出"""
+        actions = {'create': '新建', 'reissue': '重新签发', 'unchanged': '内容不变', 'skip': '跳过'}
+        lines = [
+            f'K8S配置文件根目录：{self.generator.k8s_root_dir}',
+            f'Master节点：{len(self.generator.masters)}个，'
+            f'{"沿用原CA证书" if plan["renew"] else "生成新的CA证书"}',
+            '',
+            f'{"ACTION":<11}{"PROFILE":<12}{"ARTIFACT":<40}{"CA":<24}REASON',
+        ]
+        for action, profile, rel_path, ca, reason in plan['items']:
+            lines.append(f'{action:<11}{profile:<12}{rel_path:<40}{ca or "-":<24}{reason}')
+        counts = {action: 0 for action in actions}
+        for action, *_ in plan['items']:
+            counts[action] += 1
+        serial, parallel = self.estimate(plan, workers)
+        lines.extend([
+            '',
+            '，'.join(f'{desc}{counts[action]}个' for action, desc in actions.items()),
+            f'密钥生成{plan["keygen"]}次，CA签名{plan["sign"]}次',
+            f'预计耗时：交互式生成（串行）{serial:.1f}秒',
+        ])
+        if parallel is not None:
+            profiles = self.reissue_profiles()
+            lines.append(
+                f'rotate reissue（重新签发{profiles.count("leaf")}个证书与{profiles.count("kubeconfig")}个kubeconfig，'
+                f'{workers}并发）：{parallel:.1f}秒'
+            )
+        lines.append('单个耗时（秒）：' + '，'.join(f'{profile}={cost:.3f}' for profile, cost in self.costs.items()))
+        return '\n'.join(lines)
+
+
+CERT_FILES = (
+    'pki/ca.crt',
+    'pki/front-proxy-ca.crt',
+    'pki/etcd/ca.crt',
+    'pki/apiserver.crt',
+    'pki/apiserver-kubelet-client.crt',
+    'pki/apiserver-etcd-client.crt',
+    'pki/front-proxy-client.crt',
+    'pki/etcd/server.crt',
+    'pki/etcd/peer.crt',
+    'pki/etcd/healthcheck-client.crt',
+)
+KUBECONFIG_FILES = ('admin.conf', 'controller-manager.conf', 'scheduler.conf')
+
+
+def _read_kubeconfig_cert(path):
+    """读取kubeconfig中内嵌的客户端证书"""
+    for line in path.read_text().splitlines():
+        key, _, value = line.strip().partition(':')
+        if key == 'client-certificate-data':
+            return base64.b64decode(value.strip())
+    return None
+
+
+def _der_read(data, offset):
+    """读取DER编码的TLV，返回(tag, value起始位置, value结束位置)"""
+    tag, length = data[offset], data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7f
+        length = int.from_bytes(data[offset:offset + size], 'big')
+        offset += size
+    return tag, offset, offset + length
+
+
+def cert_not_after(pem):
+    """
+    解析PEM证书（多证书时取第一个）的到期时间，不依赖openssl进程
+    :param pem: PEM格式证书内容
+    :return: UTC时间datetime
+    """
+    lines = pem.strip().splitlines()
+    der = base64.b64decode(b''.join(lines[1:lines.index(b'-----END CERTIFICATE-----')]))
+    # Certificate -> TBSCertificate
+    _, start, _ = _der_read(der, 0)
+    _, offset, _ = _der_read(der, start)
+    # 跳过version（可选）、serialNumber、signature、issuer，定位到validity
+    tag, _, end = _der_read(der, offset)
+    if tag == 0xa0:
+        _, _, end = _der_read(der, end)
+    for _ in range(2):
+        _, _, end = _der_read(der, end)
+    _, validity, _ = _der_read(der, end)
+    _, _, not_before_end = _der_read(der, validity)
+    tag, start, end = _der_read(der, not_before_end)
+    value = der[start:end].decode('ascii').rstrip('Z')
+    # UTCTime为两位年份，GeneralizedTime为四位年份
+    if tag == 0x17:
+        year = int(value[:2])
+        value = f'{1900 + year if year >= 50 else 2000 + year}{value[2:]}'
+    return datetime(
+        int(value[:4]), int(value[4:6]), int(value[6:8]),
+        int(value[8:10]), int(value[10:12]), int(value[12:14]),
+        tzinfo=timezone.utc,
+    )
+
+
+def verify_certs(k8s_root_dir='/etc/kubernetes', days=30):
+    """
+    检查证书是否存在及剩余有效期，供定时任务调用
+    :param k8s_root_dir: K8S配置文件根目录
+    :param days: 剩余有效期少于该天数视为即将过期
+    :return: 退出码，全部正常为0，否则为1
+    """
+    root = Path(k8s_root_dir)
+    deadline = datetime.now(timezone.utc) + timedelta(days=int(days))
+    failed = 0
+    for rel_path in (*CERT_FILES, *KUBECONFIG_FILES):
+        path = root / rel_path
+        if not path.is_file():
+            failed += 1
+            print(f'[MISSING] {rel_path} 证书不存在')
+            continue
+        try:
+            data = path.read_bytes() if rel_path in CERT_FILES else _read_kubeconfig_cert(path)
+            not_after = cert_not_after(data)
+        except (AttributeError, TypeError, ValueError, IndexError):
+            failed += 1
+            print(f'[INVALID] {rel_path} 证书无法解析')
+            continue
+        end_date = not_after.strftime('%Y-%m-%d %H:%M:%S UTC')
+        if not_after <= deadline:
+            failed += 1
+            print(f'[EXPIRING] {rel_path} 将在{days}天内过期，到期时间：{end_date}')
+        else:
+            print(f'[OK] {rel_path} 到期时间：{end_date}')
+    return 1 if failed else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='k8s-certs-generator', description='K8S证书生成器，不带子命令时进入交互式生成')
+    subparsers = parser.add_subparsers(dest='command')
+    verify_parser = subparsers.add_parser('verify', help='检查证书是否存在及剩余有效期')
+    verify_parser.add_argument('--k8s-root-dir', default='/etc/kubernetes', help='K8S配置文件根目录')
+    verify_parser.add_argument('--days', type=int, default=30, help='剩余有效期少于该天数视为即将过期，默认30')
+    rotate_parser = subparsers.add_parser('rotate', help='分阶段轮换CA证书，每个阶段可重复执行')
+    rotate_parser.add_argument('phase', choices=(*CARotation.phases, 'status'), help='轮换阶段，status查看进度')
+    add_generator_arguments(rotate_parser)
+    rotate_parser.add_argument('--workers', type=int, default=8, help='重新签发证书的并发数，默认8')
+    rotate_parser.add_argument('--distribute', action='store_true', help='阶段完成后通过SSH分发证书到所有Master节点')
+    rotate_parser.add_argument('--remote-root', default='/etc/kubernetes', help='Master节点K8S配置文件根目录')
+    rotate_parser.add_argument('--ssh-user', default='root', help='分发使用的SSH用户，默认root')
+    rotate_parser.add_argument('--ssh-port', type=int, default=22, help='分发使用的SSH端口，默认22')
+    plan_parser = subparsers.add_parser('plan', help='预览生成计划及预计耗时，不修改任何文件')
+    add_generator_arguments(plan_parser)
+    renew_group = plan_parser.add_mutually_exclusive_group()
+    renew_group.add_argument('--renew', dest='renew', action='store_true', default=None, help='沿用原CA证书生成')
+    renew_group.add_argument('--fresh', dest='renew', action='store_false', help='生成新的CA证书')
+    plan_parser.add_argument('--workers', type=int, default=1, help='估算rotate reissue耗时使用的并发数，交互式生成始终串行，默认1')
+    plan_parser.add_argument('--calibrate', action='store_true', help='在本机实际生成一次各类证书以测量单个耗时')
+    return parser.parse_args(argv)
+
+
+def add_generator_arguments(parser):
+    """非交互式子命令共用的生成器参数"""
+    parser.add_argument('--k8s-root-dir', default='/etc/kubernetes', help='K8S配置文件根目录')
+    parser.add_argument('--service-subnet', default='10.96.0.0/12', help='K8S Service子网CIDR，双栈以逗号分隔')
+    parser.add_argument('--certs-expire', type=int, default=3650, help='证书有效期（天）')
+    parser.add_argument('--log-level', default='info', help='日志级别')
+    parser.add_argument('--log-format', default='text', choices=('text', 'json'), help='日志格式')
+    parser.add_argument('--master', action='append', default=[], metavar='IP=HOSTNAME', help='Master节点，可重复指定')
+    parser.add_argument('--internal-ip', help='Master节点对外服务内网地址，默认为第一个Master节点IP')
+    parser.add_argument('--external-ip', help='Master节点对外服务外网地址')
+    parser.add_argument('--ca-keyfile', help=f'CA私钥加密口令文件，也可通过环境变量{CASigningContext.passphrase_env}传入口令')
+    for option, default in (
+            ('country', 'CN'),
+            ('state', 'shandong'),
+            ('city', 'jinan'),
+            ('organization', 'personal'),
+            ('organization-unit', 'personal'),
+            ('common-name', 'local.com'),
+    ):
+        parser.add_argument(f'--{option}', default=default, help=f'证书专用信息，默认{default}')
+
+
+def build_generator(args):
+    """根据命令行参数创建生成器"""
+    generator = CertsGenerator(
+        certs_expire=args.certs_expire,
+        k8s_root_dir=args.k8s_root_dir,
+        service_subnet=args.service_subnet,
+        log_level=args.log_level,
+        log_format=args.log_format,
+        ca_passphrase=os.environ.get(CASigningContext.passphrase_env) or None,
+        ca_keyfile=args.ca_keyfile,
+        country=args.country,
+        state=args.state,
+        city=args.city,
+        organization=args.organization,
+        organization_unit=args.organization_unit,
+        common_name=args.common_name,
+    )
+    for master in args.master:
+        ipaddr, sep, hostname = master.partition('=')
+        if not sep:
+            raise ValueError(f'Master节点格式错误：{master}，应为IP=HOSTNAME')
+        generator.register_master(ipaddr, hostname)
+    if args.internal_ip:
+        generator.advertise_internal_ipaddr(args.internal_ip)
+    if args.external_ip:
+        generator.advertise_external_ipaddr(args.external_ip)
+    return generator
+
+
+def rotate(args):
+    """执行CA轮换的单个阶段"""
+    try:
+        generator = build_generator(args)
+        rotation = CARotation(generator, max_workers=args.workers)
+        if args.phase == 'status':
+            for phase, done in rotation.status().items():
+                print(f'{phase}: {"已完成" if done else "未完成"}')
+            return 0
+        try:
+            getattr(rotation, args.phase)()
+            if args.distribute:
+                rotation.restore_topology(rotation.load_state())
+                distributor = CertsDistributor(
+                    generator, remote_root=args.remote_root, ssh_user=args.ssh_user, ssh_port=args.ssh_port)
+                try:
+                    distributor.distribute()
+                finally:
+                    distributor.close()
+        finally:
+            generator.lock_ca()
+    except (ValueError, RuntimeError, subprocess.CalledProcessError) as e:
+        print(f'\n{e}，退出程序！\n')
+        return 1
+    return 0
+
+
+def plan(args):
+    """输出生成计划"""
+    try:
+        planner = CertsPlanner(build_generator(args))
+        if args.calibrate:
+            planner.calibrate()
+        print(planner.render(planner.plan(renew=args.renew), workers=args.workers))
+    except (ValueError, RuntimeError, subprocess.CalledProcessError) as e:
+        print(f'\n{e}，退出程序！\n')
+        return 1
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'verify':
+        return verify_certs(args.k8s_root_dir, args.days)
+    if args.command == 'rotate':
+        return rotate(args)
+    if args.command == 'plan':
+        return plan(args)
+    return interactive()
+
+
+def interactive():
     title = """  _  __ ___  ____     ____             _           ____                                 _               
  | |/ /( _ )/ ___|   / ___| ___  _ __ | |_  ___   / ___|  ___  _ __    ___  _ __  __ _ | |_  ___   _ __ 
  | ' / / _ \\___ \  | |    / _ \| '__|| __|/ __| | |  _  / _ \| '_ \  / _ \| '__|/ _` || __|/ _ \ | '__|
@@ -745,6 +2263,9 @@ def main():
         organization = input('> 证书专用信息-O（personal）：') or 'personal'
         organization_unit = input('> 证书专用信息-OU（personal）：') or 'personal'
         common_name = input('> 证书专用信息-CN（local.com）：') or 'local.com'
+        ca_passphrase = getpass.getpass('> CA私钥加密口令（非必填，留空不加密）：') or None
+        if ca_passphrase and Path(k8s_root_dir) == Path('/etc/kubernetes'):
+            print('\n警告：本机组件无法读取加密的CA私钥，建议使用单独的生成目录并通过分发推送解密后的CA私钥！\n')
         generator = CertsGenerator(
             k8s_root_dir=k8s_root_dir,
             service_subnet=service_subnet,
@@ -756,6 +2277,7 @@ def main():
             organization=organization,
             organization_unit=organization_unit,
             common_name=common_name,
+            ca_passphrase=ca_passphrase,
         )
         more_master = 'yes'
         internal_ipaddr = None
@@ -765,15 +2287,29 @@ def main():
                 master_ipaddr = input('> 请输入Master节点IP地址（必填）：')
             while not master_hostname:
                 master_hostname = input('> 请输入Master节点Hostname（必填）：')
-            generator.register_master(master_ipaddr, master_hostname)
+            try:
+                master_ipaddr, _ = generator.register_master(master_ipaddr, master_hostname)
+            except ValueError as e:
+                print(f'\n{e}，请重新输入！\n')
+                continue
             if not internal_ipaddr:
                 internal_ipaddr = master_ipaddr
             more_master = input('> 是否继续添加Master节点（yes/no，默认no）：')
-        internal_ipaddr = input(f'> 请输入Master节点对外服务内网地址（{internal_ipaddr}）：') or internal_ipaddr
-        generator.advertise_internal_ipaddr(internal_ipaddr)
-        external_ipaddr = input('> 请输入Master节点对外服务外网地址（非必填）：')
-        if external_ipaddr:
-            generator.advertise_external_ipaddr(external_ipaddr)
+        while True:
+            try:
+                generator.advertise_internal_ipaddr(
+                    input(f'> 请输入Master节点对外服务内网地址（{internal_ipaddr}）：') or internal_ipaddr)
+                break
+            except ValueError as e:
+                print(f'\n{e}，请重新输入！\n')
+        while True:
+            try:
+                external_ipaddr = input('> 请输入Master节点对外服务外网地址（非必填）：')
+                if external_ipaddr:
+                    generator.advertise_external_ipaddr(external_ipaddr)
+                break
+            except ValueError as e:
+                print(f'\n{e}，请重新输入！\n')
         is_renew = input('> 是否根据原CA根证书生成其他证书（yes/no，默认no）：')
         renew = True if is_renew.lower() in ('yes', 'y') else False
         if renew:
@@ -781,20 +2317,54 @@ def main():
             if msg:
                 print(f'\n{msg}，退出程序！\n')
                 return
+            try:
+                generator.unlock_ca()
+            except subprocess.CalledProcessError:
+                print('\n原CA私钥读取失败，请检查CA私钥加密口令，退出程序！\n')
+                return
+        elif ca_passphrase:
+            # 生成新CA时二次确认口令，输错后CA私钥将无法解密
+            while getpass.getpass('> 请再次输入CA私钥加密口令：') != ca_passphrase:
+                print('\n两次输入的CA私钥加密口令不一致，请重新输入！\n')
+                ca_passphrase = getpass.getpass('> CA私钥加密口令（非必填，留空不加密）：') or None
+                if not ca_passphrase:
+                    break
+            generator.signing_context = CASigningContext(ca_passphrase)
         is_show = input('> 是否展示生成证书具体信息（yes/no，默认no）：')
         show = True if is_show.lower() in ('yes', 'y') else False
+        is_distribute = input('> 是否通过SSH分发证书到所有Master节点（yes/no，默认no）：')
+        distribute = True if is_distribute.lower() in ('yes', 'y') else False
+        if distribute:
+            remote_root = input('> Master节点K8S配置文件根目录（/etc/kubernetes）：') or '/etc/kubernetes'
+            ssh_user = input('> SSH用户（root）：') or 'root'
+            ssh_port = ''
+            while not ssh_port.isdigit():
+                ssh_port = input('> SSH端口（22）：') or '22'
+            ssh_port = int(ssh_port)
         is_start = input('> 是否开始生成证书（yes/no，默认yes）：') or 'yes'
         if is_start.lower() in ('yes', 'y'):
             print('\n\n')
-            if not renew:
-                generator.generate_ca_all(show=show)
-            generator.generate_certs_all(show=show)
-            generator.generate_sa_all()
-            generator.generate_cluster_config_all(show=show)
-            generator.clear()
+            try:
+                if not renew:
+                    generator.generate_ca_all(show=show)
+                generator.generate_certs_all(show=show)
+                generator.generate_sa_all()
+                generator.generate_cluster_config_all(show=show)
+                generator.clear()
+                if distribute:
+                    distributor = CertsDistributor(
+                        generator, remote_root=remote_root, ssh_user=ssh_user, ssh_port=ssh_port)
+                    try:
+                        distributor.distribute()
+                    finally:
+                        distributor.close()
+            finally:
+                generator.lock_ca()
+    except ValueError as e:
+        print(f'\n{e}，退出程序！\n')
     except KeyboardInterrupt:
         pass
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -0,0 +1,89 @@
+# -*- coding:utf-8 -*-
+"""
+@author: superwongo
+@project: k8s-certs-generator
+@file: test_distribute
+@time: 2026/10/18
+"""
+
+import os
+import stat
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+spec = importlib.util.spec_from_file_location('k8s_certs_generator', ROOT_DIR / 'k8s-certs-generator.py')
+kcg = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(kcg)
+
+
+class LocalTransportDistributeTest(unittest.TestCase):
+    def setUp(self):
+        self.src_dir = tempfile.TemporaryDirectory()
+        self.dst_dir = tempfile.TemporaryDirectory()
+        self.generator = kcg.CertsGenerator(k8s_root_dir=self.src_dir.name, log_level='warning')
+        self.generator.register_master('192.168.1.11', 'k8s-master-01')
+        self.generator.register_master('192.168.1.12', 'k8s-master-02')
+        for rel_path in ('pki/ca.crt', 'pki/ca.key', 'pki/etcd/ca.crt', 'admin.conf'):
+            path = Path(self.src_dir.name) / rel_path
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(rel_path)
+        (Path(self.generator.certs_root_dir) / kcg.CARotation.dir_name).mkdir()
+        (Path(self.generator.certs_root_dir) / kcg.CARotation.dir_name / 'state.json').write_text('{}')
+        self.distributor = kcg.CertsDistributor(
+            self.generator,
+            transport_factory=lambda ipaddr, hostname: kcg.LocalTransport(
+                ipaddr, hostname, target_dir=self.dst_dir.name),
+        )
+
+    def tearDown(self):
+        self.distributor.close()
+        self.src_dir.cleanup()
+        self.dst_dir.cleanup()
+
+    def test_distribute_is_incremental(self):
+        expected = ['pki/ca.crt', 'pki/ca.key', 'pki/etcd/ca.crt', 'admin.conf']
+        results = self.distributor.distribute()
+        self.assertEqual(results, {'k8s-master-01': expected, 'k8s-master-02': expected})
+        for hostname in results:
+            self.assertEqual((Path(self.dst_dir.name) / hostname / 'pki/etcd/ca.crt').read_text(), 'pki/etcd/ca.crt')
+            self.assertFalse((Path(self.dst_dir.name) / hostname / 'pki/rotation').exists())
+
+        results = self.distributor.distribute()
+        self.assertEqual(results, {'k8s-master-01': [], 'k8s-master-02': []})
+
+        (Path(self.src_dir.name) / 'admin.conf').write_text('changed')
+        results = self.distributor.distribute()
+        self.assertEqual(results, {'k8s-master-01': ['admin.conf'], 'k8s-master-02': ['admin.conf']})
+
+    def test_distribute_decrypted_ca_key(self):
+        key_file = Path(self.generator.certs_root_dir) / 'ca.key'
+        subprocess.run(
+            ['openssl', 'genrsa', '-aes256', '-passout', 'pass:secret', '-out', str(key_file), '2048'],
+            capture_output=True, check=True,
+        )
+        self.generator.signing_context = kcg.CASigningContext(passphrase='secret')
+        self.distributor.distribute()
+        pushed = Path(self.dst_dir.name) / 'k8s-master-01' / 'pki/ca.key'
+        self.assertNotIn(b'ENCRYPTED', pushed.read_bytes())
+        self.assertEqual(bytes(self.generator.signing_context.load(self.generator.certs_root_dir, 'ca')),
+                         pushed.read_bytes())
+        self.assertEqual(stat.S_IMODE(os.stat(pushed).st_mode), 0o600)
+        self.assertIn(b'ENCRYPTED', key_file.read_bytes())
+
+        results = self.distributor.distribute()
+        self.assertEqual(results, {'k8s-master-01': [], 'k8s-master-02': []})
+
+    def test_default_transport_uses_remote_root(self):
+        distributor = kcg.CertsDistributor(self.generator, ssh_user='ops', ssh_port=2222)
+        transport = distributor.pool.transport_factory('192.168.1.11', 'k8s-master-01')
+        self.assertEqual(transport.remote_root, '/etc/kubernetes')
+        self.assertEqual(transport.destination, 'ops@192.168.1.11')
+        self.assertEqual(transport.port, 2222)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# -*- coding:utf-8 -*-
+"""
+@author: superwongo
+@project: k8s-certs-generator
+@file: test_logging
+@time: 2026/10/18
+"""
+
+import json
+import queue
+import logging
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+spec = importlib.util.spec_from_file_location('k8s_certs_generator', ROOT_DIR / 'k8s-certs-generator.py')
+kcg = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(kcg)
+
+
+class SharedLoggingTest(unittest.TestCase):
+    def setUp(self):
+        kcg.shutdown_logging()
+        self.root_dir = tempfile.TemporaryDirectory()
+        self.queue = queue.Queue()
+        kcg.setup_logging('info', log_format='json', log_queue=self.queue, listen=False)
+
+    def tearDown(self):
+        kcg.shutdown_logging()
+        self.root_dir.cleanup()
+
+    def records(self):
+        records = []
+        while not self.queue.empty():
+            records.append(self.queue.get_nowait())
+        return records
+
+    def generator(self, index, **kwargs):
+        return kcg.CertsGenerator(
+            k8s_root_dir=f'{self.root_dir.name}/{index}', cluster_id=f'cluster-{index}', **kwargs)
+
+    def test_generators_share_one_handler(self):
+        generators = [self.generator(index) for index in range(3)]
+        self.assertEqual(self.records(), [])
+
+        generators[1].logger.info('=====已创建证书=====', extra={'artifact': 'pki/ca.crt'})
+        records = self.records()
+        self.assertEqual(len(records), 1)
+        data = json.loads(kcg.JsonFormatter().format(records[0]))
+        self.assertEqual(data['cluster'], 'cluster-1')
+        self.assertEqual(data['artifact'], 'pki/ca.crt')
+        self.assertEqual(data['message'], '=====已创建证书=====')
+
+    def test_levels_are_per_generator(self):
+        quiet = self.generator(0, log_level='warning')
+        verbose = self.generator(1, log_level='debug')
+        quiet.logger.info('quiet')
+        verbose.logger.info('verbose')
+        self.assertEqual([record.getMessage() for record in self.records()], ['verbose'])
+
+    def test_explicit_format_mismatch_warns(self):
+        self.generator(0, log_format='text')
+        self.generator(1, log_format='json')
+        records = self.records()
+        self.assertEqual([record.levelno for record in records], [logging.WARNING])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding:utf-8 -*-
+"""
+@author: superwongo
+@project: k8s-certs-generator
+@file: test_plan
+@time: 2026/10/18
+"""
+
+import tempfile
+import unittest
+import importlib.util
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+spec = importlib.util.spec_from_file_location('k8s_certs_generator', ROOT_DIR / 'k8s-certs-generator.py')
+kcg = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(kcg)
+
+
+class CertsPlannerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root_dir = tempfile.TemporaryDirectory()
+        generator = kcg.CertsGenerator(k8s_root_dir=cls.root_dir.name, log_level='warning')
+        generator.register_master('192.168.1.11', 'k8s-master-01')
+        generator.generate_ca_all()
+        generator.generate_certs_all()
+        generator.generate_sa_all()
+        generator.generate_cluster_config_all()
+        generator.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.root_dir.cleanup()
+
+    def plan(self, *masters, internal_ipaddr=None):
+        generator = kcg.CertsGenerator(k8s_root_dir=self.root_dir.name, log_level='warning')
+        for ipaddr, hostname in masters:
+            generator.register_master(ipaddr, hostname)
+        if internal_ipaddr:
+            generator.advertise_internal_ipaddr(internal_ipaddr)
+        items = kcg.CertsPlanner(generator).plan()['items']
+        return {rel_path: (action, reason) for action, _, rel_path, _, reason in items}
+
+    def test_same_topology_is_unchanged(self):
+        items = self.plan(('192.168.1.11', 'k8s-master-01'))
+        self.assertEqual(items['pki/ca.crt'][0], 'skip')
+        self.assertEqual(items['pki/apiserver.crt'][0], 'unchanged')
+        self.assertEqual(items['admin.conf'][0], 'unchanged')
+        self.assertEqual(items['pki/sa.key'][0], 'reissue')
+
+    def test_topology_change_reissues(self):
+        items = self.plan(
+            ('192.168.1.11', 'k8s-master-01'), ('192.168.1.12', 'k8s-master-02'), internal_ipaddr='192.168.1.100')
+        self.assertEqual(items['pki/etcd/server.crt'], ('reissue', '新增SAN：k8s-master-02,192.168.1.12'))
+        self.assertEqual(items['pki/etcd/healthcheck-client.crt'][0], 'unchanged')
+        self.assertEqual(items['admin.conf'][0], 'reissue')
+        self.assertIn('https://192.168.1.100:6443', items['admin.conf'][1])
+
+    def test_reissue_estimate(self):
+        generator = kcg.CertsGenerator(k8s_root_dir=self.root_dir.name, log_level='warning')
+        generator.register_master('192.168.1.11', 'k8s-master-01')
+        planner = kcg.CertsPlanner(generator, costs={'leaf': 1, 'kubeconfig': 1, 'ca': 100, 'sa': 100})
+        plan = planner.plan()
+        self.assertEqual(planner.estimate(plan, workers=1)[1], 10)
+        self.assertEqual(planner.estimate(plan, workers=4)[1], 3)
+        self.assertIn('rotate reissue', planner.render(plan, workers=4))
+
+    def test_reissue_estimate_requires_ca(self):
+        with tempfile.TemporaryDirectory() as root_dir:
+            generator = kcg.CertsGenerator(k8s_root_dir=root_dir, log_level='warning')
+            generator.register_master('192.168.1.11', 'k8s-master-01')
+            planner = kcg.CertsPlanner(generator)
+            plan = planner.plan()
+            self.assertIsNone(planner.estimate(plan, workers=4)[1])
+            self.assertNotIn('rotate reissue', planner.render(plan, workers=4))
+
+    def test_no_master_is_rejected(self):
+        with self.assertRaises(RuntimeError):
+            self.plan()
+
+
+if __name__ == '__main__':
+    unittest.main()
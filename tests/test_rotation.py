@@ -0,0 +1,112 @@
+# -*- coding:utf-8 -*-
+"""
+@author: superwongo
+@project: k8s-certs-generator
+@file: test_rotation
+@time: 2026/10/18
+"""
+
+import json
+import tempfile
+import unittest
+import subprocess
+import importlib.util
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+spec = importlib.util.spec_from_file_location('k8s_certs_generator', ROOT_DIR / 'k8s-certs-generator.py')
+kcg = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(kcg)
+
+
+class CARotationTest(unittest.TestCase):
+    def setUp(self):
+        self.root_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.root_dir.name)
+
+    def tearDown(self):
+        self.root_dir.cleanup()
+
+    def generator(self, masters=(), **kwargs):
+        generator = kcg.CertsGenerator(k8s_root_dir=self.root_dir.name, log_level='warning', **kwargs)
+        for ipaddr, hostname in masters:
+            generator.register_master(ipaddr, hostname)
+        return generator
+
+    def generate(self, **kwargs):
+        generator = self.generator([('192.168.1.11', 'k8s-master-01')], **kwargs)
+        generator.generate_ca_all()
+        generator.generate_certs_all()
+        generator.generate_sa_all()
+        generator.generate_cluster_config_all()
+        generator.lock_ca()
+        generator.clear()
+
+    def issued_by(self, cert_file, ca_file):
+        ret = subprocess.run(
+            ['openssl', 'verify', '-no_check_time', '-CAfile', str(ca_file), str(cert_file)], capture_output=True)
+        return ret.returncode == 0
+
+    def test_rotation_phases(self):
+        self.generate()
+        old_ca = (self.root / 'pki/ca.crt').read_bytes()
+        # 后续阶段不指定master节点，使用prepare阶段记录的拓扑
+        rotation = kcg.CARotation(self.generator([('192.168.1.11', 'k8s-master-01')]), max_workers=4)
+        self.assertTrue(rotation.prepare())
+        self.assertFalse(rotation.prepare())
+        new_ca = (self.root / 'pki/rotation/new/ca.crt').read_bytes()
+        self.assertEqual((self.root / 'pki/ca.crt').read_bytes(), old_ca + new_ca)
+
+        rotation = kcg.CARotation(self.generator(), max_workers=4)
+        self.assertTrue(rotation.reissue())
+        self.assertFalse(rotation.reissue())
+        apiserver = self.root / 'pki/apiserver.crt'
+        self.assertTrue(self.issued_by(apiserver, self.root / 'pki/rotation/new/ca.crt'))
+        self.assertIn(('DNS', 'k8s-master-01'), kcg.CertsPlanner.cert_sans(apiserver))
+        self.assertIn(('IP', '192.168.1.11'), kcg.CertsPlanner.cert_sans(apiserver))
+
+        distributor = kcg.CertsDistributor(rotation.generator)
+        manifest = distributor.manifest()
+        self.assertIn('pki/rotation/new/ca.key', manifest)
+        self.assertNotIn('pki/rotation/state.json', manifest)
+        self.assertFalse(any(rel_path.startswith('pki/rotation/old/') for rel_path in manifest))
+
+        self.assertTrue(rotation.finalize())
+        self.assertFalse(rotation.finalize())
+        self.assertEqual((self.root / 'pki/ca.crt').read_bytes(), new_ca)
+        self.assertTrue(self.issued_by(apiserver, self.root / 'pki/ca.crt'))
+        self.assertFalse(rotation.rotation_dir.exists())
+        self.assertEqual(rotation.status(), {'prepare': False, 'reissue': False, 'finalize': False})
+
+    def test_prepare_requires_masters(self):
+        self.generate()
+        with self.assertRaises(RuntimeError):
+            kcg.CARotation(self.generator()).prepare()
+        self.assertFalse((self.root / 'pki/rotation').exists())
+
+    def test_reissue_checks_topology_before_signing(self):
+        self.generate()
+        rotation = kcg.CARotation(self.generator([('192.168.1.11', 'k8s-master-01')]))
+        rotation.prepare()
+        state = rotation.load_state()
+        state['topology']['masters'] = []
+        rotation.save_state(state)
+        apiserver = (self.root / 'pki/apiserver.crt').read_bytes()
+        with self.assertRaises(RuntimeError):
+            kcg.CARotation(self.generator()).reissue()
+        self.assertEqual((self.root / 'pki/apiserver.crt').read_bytes(), apiserver)
+        self.assertEqual(json.loads(rotation.state_file.read_text())['phases'], ['prepare'])
+
+    def test_prepare_refuses_plaintext_keys_for_encrypted_ca(self):
+        self.generate(ca_passphrase='secret')
+        with self.assertRaisesRegex(RuntimeError, '加密口令'):
+            kcg.CARotation(self.generator([('192.168.1.11', 'k8s-master-01')])).prepare()
+        self.assertFalse((self.root / 'pki/rotation/new/ca.key').exists())
+
+        rotation = kcg.CARotation(self.generator([('192.168.1.11', 'k8s-master-01')], ca_passphrase='secret'))
+        self.assertTrue(rotation.prepare())
+        self.assertTrue(kcg.CASigningContext.key_encrypted(self.root / 'pki/rotation/new/ca.key'))
+
+
+if __name__ == '__main__':
+    unittest.main()
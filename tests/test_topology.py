@@ -0,0 +1,78 @@
+# -*- coding:utf-8 -*-
+"""
+@author: superwongo
+@project: k8s-certs-generator
+@file: test_topology
+@time: 2026/10/18
+"""
+
+import unittest
+import importlib.util
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+spec = importlib.util.spec_from_file_location('k8s_certs_generator', ROOT_DIR / 'k8s-certs-generator.py')
+kcg = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(kcg)
+
+
+class ClusterTopologyTest(unittest.TestCase):
+    @staticmethod
+    def ipaddrs(alt_names):
+        return [value for key, value in alt_names if key.startswith('IP.')]
+
+    def test_advertise_ipaddr_equal_to_master_is_deduplicated(self):
+        topology = kcg.ClusterTopology()
+        topology.register_master('192.168.1.11', 'k8s-master-01')
+        topology.register_master('192.168.1.12', 'k8s-master-02')
+        topology.advertise_internal_ipaddr = '192.168.1.11'
+        topology.advertise_external_ipaddr = '192.168.1.12'
+        self.assertEqual(self.ipaddrs(topology.apiserver_alt_names), ['10.96.0.1', '192.168.1.11', '192.168.1.12'])
+        self.assertEqual([key for key, _ in topology.apiserver_alt_names if key.startswith('IP.')],
+                         ['IP.0', 'IP.1', 'IP.2'])
+
+    def test_service_vip_non_octet_aligned(self):
+        self.assertEqual(kcg.ClusterTopology('172.16.0.0/20').service_vips, ['172.16.0.1'])
+        self.assertEqual(kcg.ClusterTopology('172.16.5.7/20').service_vips, ['172.16.0.1'])
+
+    def test_service_vip_ipv6(self):
+        topology = kcg.ClusterTopology('fd00:10:96::/112')
+        self.assertEqual(topology.service_vips, ['fd00:10:96::1'])
+        topology.register_master('FD00::0011', 'k8s-master-01')
+        self.assertEqual(topology.masters, [('fd00::11', 'k8s-master-01')])
+        self.assertEqual(topology.api_server, 'https://[fd00::11]:6443')
+
+    def test_dual_stack(self):
+        topology = kcg.ClusterTopology(' 10.96.0.0/12 , fd00:10:96::/112 ')
+        self.assertEqual(topology.service_vips, ['10.96.0.1', 'fd00:10:96::1'])
+        self.assertIn('fd00:10:96::1', self.ipaddrs(topology.apiserver_alt_names))
+        for service_subnet in ('10.96.0.0/12,10.97.0.0/16', 'fd00::/112,fd01::/112', '', ',', '10.96.0.0/33',
+                               'abc', '10.96.0.1/32'):
+            with self.subTest(service_subnet=service_subnet):
+                with self.assertRaises(ValueError):
+                    kcg.ClusterTopology(service_subnet)
+
+    def test_hostname_normalization(self):
+        topology = kcg.ClusterTopology()
+        self.assertEqual(topology.register_master(' 192.168.1.11 ', 'K8S-Master-01.Local.'),
+                         ('192.168.1.11', 'k8s-master-01.local'))
+        self.assertEqual(topology.register_master('192.168.1.11', 'k8s-master-01.local'),
+                         ('192.168.1.11', 'k8s-master-01.local'))
+        self.assertEqual(len(topology.masters), 1)
+        for hostname in ('', '-master', 'master-', 'k8s_master', 'a' * 64, 'a..b'):
+            with self.subTest(hostname=hostname):
+                with self.assertRaises(ValueError):
+                    topology.register_master('192.168.1.12', hostname)
+        with self.assertRaises(ValueError):
+            topology.register_master('192.168.1.300', 'k8s-master-02')
+
+    def test_api_server_requires_advertise_ipaddr(self):
+        topology = kcg.ClusterTopology()
+        with self.assertRaises(ValueError):
+            topology.api_server
+        topology.register_master('192.168.1.11', 'k8s-master-01')
+        self.assertEqual(topology.api_server, 'https://192.168.1.11:6443')
+
+
+if __name__ == '__main__':
+    unittest.main()